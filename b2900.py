@@ -1,16 +1,34 @@
-import pyvisa
 import time
+import visa_pool
+from tracing import TracedResource
 
 class B2900Controller:
     def __init__(self, address: str, timeout: int = 10000):
-        self.rm = pyvisa.ResourceManager()
-        self.instrument = self.rm.open_resource(address)
-        self.instrument.timeout = timeout
-        self.instrument.write_termination = '\n'
-        self.instrument.read_termination = '\n'
+        self.address = address
+        self.rm = visa_pool.get_resource_manager()
+        session = visa_pool.open_resource(address, timeout=timeout,
+                                          write_termination='\n', read_termination='\n')
+        self.reused = session.reused
+        self.instrument = TracedResource(session, "b2900")
+        self.voltage_compliance = None
+        self.current_compliance = None
+        self.sample_time = None
+
+    def encode_command(self, command: str) -> bytes:
+        """Returns the bytes instrument.write would send for `command`"""
+        return f"{command}{self.instrument.write_termination}".encode(self.instrument.encoding)
+
+    def write_raw(self, payload: bytes):
+        """Sends a command pre-encoded with encode_command"""
+        self.instrument.write_raw(payload)
 
     def close(self):
-        self.instrument.close()
+        """Leaves the pooled session open for the next run; use visa_pool.close() to really disconnect."""
+        pass
+
+    def clear(self):
+        """Device clear: drops pending replies, e.g. the late answer of a timed-out query."""
+        self.instrument.clear()
 
     def reset(self):
         self.instrument.write("*RST")
@@ -57,9 +75,11 @@ class B2900Controller:
 
     def set_voltage_compliance(self, limit: float):
         self.instrument.write(f":SENS:VOLT:PROT {limit}")
+        self.voltage_compliance = limit
 
     def set_current_compliance(self, limit: float):
         self.instrument.write(f":SENS:CURR:PROT {limit}")
+        self.current_compliance = limit
 
     def measure_voltage(self) -> float:
         return float(self.instrument.query(":MEAS:VOLT?").strip())
@@ -88,3 +108,169 @@ class B2900Controller:
 
     def init_output(self):
         self.instrument.write(":INIT")
+
+    # -- Measurement speed profiles --
+
+    VOLTAGE_RANGES = (0.2, 2, 20, 200)
+    CURRENT_RANGES = (1e-8, 1e-7, 1e-6, 1e-5, 1e-4, 1e-3, 1e-2, 1e-1, 1, 1.5, 3)
+    # Integration time and range policy of each profile
+    MEASUREMENT_PROFILES = {
+        "fast": {"nplc": 0.01, "auto_range": False},
+        "normal": {"nplc": 0.1, "auto_range": False},
+        "precise": {"nplc": 10, "auto_range": True},
+    }
+    # Trigger and bus overhead of one :MEAS? spot measurement, in seconds
+    MEASUREMENT_OVERHEAD = 2e-3
+
+    def set_nplc(self, mode: str, nplc: float):
+        """Integration time in power line cycles (0.0004 to 100)"""
+        assert mode.upper() in ["CURR", "VOLT", "RES"]
+        if not 4e-4 <= nplc <= 100:
+            raise ValueError("NPLC must be between 0.0004 and 100.")
+        self.instrument.write(f":SENS:{mode.upper()}:NPLC {nplc}")
+
+    def set_measurement_range(self, mode: str, value: float):
+        """Fixes the measurement range (auto range off)"""
+        assert mode.upper() in ["CURR", "VOLT"]
+        self.instrument.write(f":SENS:{mode.upper()}:RANG:AUTO OFF")
+        self.instrument.write(f":SENS:{mode.upper()}:RANG {value}")
+
+    def set_measurement_auto_range(self, mode: str, enable: bool, lower_limit: float = None):
+        assert mode.upper() in ["CURR", "VOLT"]
+        self.instrument.write(f":SENS:{mode.upper()}:RANG:AUTO {'ON' if enable else 'OFF'}")
+        if enable and lower_limit is not None:
+            self.instrument.write(f":SENS:{mode.upper()}:RANG:AUTO:LLIM {lower_limit}")
+
+    def compliance_range(self, mode: str) -> float:
+        """Smallest measurement range that holds the compliance limit of `mode`"""
+        assert mode.upper() in ["CURR", "VOLT"]
+        mode = mode.upper()
+        limit = self.voltage_compliance if mode == "VOLT" else self.current_compliance
+        if limit is None:
+            limit = float(self.instrument.query(f":SENS:{mode}:PROT?").strip())
+        ranges = self.VOLTAGE_RANGES if mode == "VOLT" else self.CURRENT_RANGES
+        return next((r for r in ranges if r >= abs(limit)), ranges[-1])
+
+    def apply_measurement_profile(self, profile: str = "normal", sense: str = "VOLT",
+                                  line_frequency: float = 50) -> float:
+        """
+        Sets NPLC and range policy for `sense` from MEASUREMENT_PROFILES.
+
+        Fixed ranges are the smallest that hold the compliance, so a reading
+        at the limit is never over range. Returns the expected time of one
+        spot measurement in seconds, also kept in sample_time.
+        """
+        if profile not in self.MEASUREMENT_PROFILES:
+            raise ValueError(f"Profile must be one of {', '.join(self.MEASUREMENT_PROFILES)}.")
+        settings = self.MEASUREMENT_PROFILES[profile]
+        sense = sense.upper()
+        self.set_sense_function(sense)
+        self.set_nplc(sense, settings["nplc"])
+        if settings["auto_range"]:
+            self.set_measurement_auto_range(sense, True)
+        else:
+            self.set_measurement_range(sense, self.compliance_range(sense))
+
+        self.sample_time = settings["nplc"] / line_frequency + self.MEASUREMENT_OVERHEAD
+        return self.sample_time
+
+    # -- Pulsed source and list sweeps --
+
+    LIST_MAX_POINTS = 2500
+
+    def set_source_shape(self, shape: str):
+        assert shape.upper() in ["DC", "PULS"]
+        self.instrument.write(f":SOUR:FUNC:SHAP {shape.upper()}")
+
+    def set_pulse_timing(self, delay: float, width: float):
+        """Pulse delay after the trigger and pulse width, in seconds."""
+        self.instrument.write(f":SOUR:PULS:DEL {delay}")
+        self.instrument.write(f":SOUR:PULS:WIDT {width}")
+
+    def configure_pulse(self, mode: str, base: float, peak: float, width: float, delay: float = 0):
+        """Pulsed output: `base` between pulses, `peak` during each triggered pulse."""
+        assert mode.upper() in ["CURR", "VOLT"]
+        self.set_source_mode(mode)
+        self.set_source_shape("PULS")
+        self.instrument.write(f":SOUR:{mode.upper()} {base}")
+        self.instrument.write(f":SOUR:{mode.upper()}:TRIG {peak}")
+        self.set_pulse_timing(delay, width)
+
+    def set_sweep_list(self, mode: str, values):
+        """Sources one list value per trigger (the pulse peaks in pulsed mode)."""
+        assert mode.upper() in ["CURR", "VOLT"]
+        if not 0 < len(values) <= self.LIST_MAX_POINTS:
+            raise ValueError(f"A list sweep takes 1 to {self.LIST_MAX_POINTS} points.")
+        self.instrument.write(f":SOUR:{mode.upper()}:MODE LIST")
+        self.instrument.write(f":SOUR:LIST:{mode.upper()} " + ",".join(str(float(v)) for v in values))
+
+    def set_sense_function(self, mode: str):
+        assert mode.upper() in ["CURR", "VOLT", "RES"]
+        self.instrument.write(f":SENS:FUNC \"{mode.upper()}\"")
+
+    def set_measurement_aperture(self, mode: str, aperture: float):
+        assert mode.upper() in ["CURR", "VOLT", "RES"]
+        self.instrument.write(f":SENS:{mode.upper()}:APER {aperture}")
+
+    def configure_trigger(self, count: int, period: float, source_delay: float = 0, measure_delay: float = 0):
+        """Timer trigger: `count` source+measure cycles every `period` seconds."""
+        self.instrument.write(":TRIG:SOUR TIM")
+        self.instrument.write(f":TRIG:TIM {period}")
+        self.instrument.write(f":TRIG:COUN {count}")
+        self.instrument.write(f":TRIG:TRAN:DEL {source_delay}")
+        self.instrument.write(f":TRIG:ACQ:DEL {measure_delay}")
+
+    def restore_dc_source(self, mode: str = "CURR"):
+        """Back to a fixed DC output with the automatic trigger, as after a reset."""
+        assert mode.upper() in ["CURR", "VOLT"]
+        self.set_source_shape("DC")
+        self.instrument.write(f":SOUR:{mode.upper()}:MODE FIX")
+        self.instrument.write(":TRIG:SOUR AINT")
+        self.instrument.write(":TRIG:COUN 1")
+        self.instrument.write(":TRIG:TRAN:DEL 0")
+        self.instrument.write(":TRIG:ACQ:DEL 0")
+
+    def fetch_array(self, mode: str = "VOLT") -> list:
+        assert mode.upper() in ["CURR", "VOLT", "RES", "TIME"]
+        return [float(v) for v in self.instrument.query(f":FETC:ARR:{mode.upper()}? (@1)").split(",")]
+
+    def pulsed_sweep(self, values, width: float, delay: float = 0, base: float = 0.0,
+                     measure_delay: float = None, aperture: float = None, period: float = None,
+                     mode: str = "CURR", sense: str = "VOLT") -> list:
+        """
+        Runs a whole pulsed list sweep from one trigger and returns the readings.
+
+        Each value is applied as a `width` long pulse on top of `base`. The
+        measurement window (`aperture`, default half the pulse) starts
+        `measure_delay` after the trigger, by default so that it ends with
+        the pulse, where the output has settled the longest. The source is
+        put back to fixed DC output with the automatic trigger afterwards,
+        even if the sweep fails.
+        """
+        if aperture is None:
+            aperture = width / 2
+        if measure_delay is None:
+            measure_delay = delay + width - aperture
+        if measure_delay < delay or measure_delay + aperture > delay + width:
+            raise ValueError("The measurement window must lie inside the pulse.")
+        if period is None:
+            period = max(2 * (delay + width), 1e-3)
+        if period <= delay + width:
+            raise ValueError("The trigger period must be longer than pulse delay + width.")
+
+        timeout = self.instrument.timeout
+        try:
+            self.configure_pulse(mode, base, values[0], width, delay)
+            self.set_sweep_list(mode, values)
+            self.set_sense_function(sense)
+            self.set_measurement_aperture(sense, aperture)
+            self.configure_trigger(len(values), period, measure_delay=measure_delay)
+
+            # *OPC? returns when the last pulse is done; allow for the whole run
+            self.instrument.timeout = max(timeout, int(1000 * len(values) * period) + timeout)
+            self.instrument.write(":INIT (@1)")
+            self.instrument.query("*OPC?")
+            return self.fetch_array(sense)
+        finally:
+            self.instrument.timeout = timeout
+            self.restore_dc_source(mode)
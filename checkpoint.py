@@ -0,0 +1,137 @@
+import glob
+import json
+import os
+import time
+from datetime import datetime
+import pyvisa
+import serial
+
+# Errors that are worth retrying: bus timeouts, dropped links, serial glitches.
+TRANSIENT_ERRORS = (pyvisa.errors.VisaIOError, serial.SerialException, OSError)
+
+
+def is_timeout(error):
+    return isinstance(error, pyvisa.errors.VisaIOError) and error.error_code == pyvisa.constants.StatusCode.error_timeout
+
+
+class RetryPolicy:
+    """
+    Retries an instrument call a bounded number of times with exponential backoff.
+
+    The reply to a query that timed out may still arrive and would be read
+    by the retried query, shifting every later reading by one. VISA
+    timeouts are therefore only retried when `clear` is given: it is
+    called before each retry to device-clear the instruments.
+    """
+
+    def __init__(self, attempts=3, delay=0.5, backoff=2.0, retry_on=TRANSIENT_ERRORS, clear=None):
+        if attempts < 1:
+            raise ValueError("attempts must be at least 1")
+        self.attempts = attempts
+        self.delay = delay
+        self.backoff = backoff
+        self.retry_on = retry_on
+        self.clear = clear
+
+    def call(self, func, *args):
+        """Returns func(*args), re-raising the last error once all attempts fail."""
+        delay = self.delay
+        for attempt in range(1, self.attempts + 1):
+            try:
+                return func(*args)
+            except self.retry_on as e:
+                if attempt == self.attempts or (is_timeout(e) and self.clear is None):
+                    raise
+                print(f"Transient error ({e}), retry {attempt}/{self.attempts - 1} in {delay:.2f} s")
+                time.sleep(delay)
+                if self.clear is not None:
+                    self.clear()
+                delay *= self.backoff
+
+
+class Checkpoint:
+    """
+    Append-only checkpoint of a sweep: one JSON line per completed point.
+
+    The first line holds the run configuration; every following line holds
+    the data entry of a point and the sweep position to continue from, so
+    writing a point costs one small append regardless of run length.
+    finish() marks the run as complete; start() refuses to overwrite a
+    checkpoint of an unfinished run unless told to.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self._file = None
+
+    def exists(self):
+        return os.path.exists(self.filename) and os.path.getsize(self.filename) > 0
+
+    def is_complete(self):
+        """True if the checkpointed run was finished"""
+        with open(self.filename) as f:
+            lines = f.read().splitlines()
+        return bool(lines) and lines[-1] == json.dumps({"complete": True})
+
+    def start(self, config, overwrite=False):
+        """Starts a new checkpoint, discarding a previous one that is complete or when overwrite is set."""
+        self.close()
+        if self.exists() and not overwrite and not self.is_complete():
+            raise ValueError(f"Checkpoint {self.filename} holds an unfinished run; resume it or overwrite it explicitly.")
+        self._file = open(self.filename, "w")
+        self._write({"config": config})
+
+    def finish(self):
+        """Marks the run as complete and closes the checkpoint."""
+        if self._file is None:
+            self._file = open(self.filename, "a")
+        self._write({"complete": True})
+        self.close()
+
+    def append(self, entry, state):
+        """Records a completed point and the position the sweep continues from."""
+        if self._file is None:
+            self._file = open(self.filename, "a")
+        self._write({"entry": list(entry), "state": state})
+
+    def _write(self, record):
+        self._file.write(json.dumps(record) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def load(self):
+        """Returns (config, entries, state); state is None if no point was completed."""
+        config, entries, state = None, [], None
+        with open(self.filename) as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # A crash mid-write leaves at most one truncated trailing line
+                    break
+                if "config" in record:
+                    config = record["config"]
+                elif "entry" in record:
+                    entries.append(tuple(record["entry"]))
+                    state = record["state"]
+        return config, entries, state
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def default_checkpoint_file(expt_name, resume=False):
+    """
+    Checkpoint file name for a run of expt_name, unique per start time.
+
+    With resume, the newest existing checkpoint of expt_name is returned
+    instead, if there is one.
+    """
+    prefix = expt_name or "measurement"
+    if resume:
+        existing = sorted(glob.glob(f"{glob.escape(prefix)}_*_checkpoint.jsonl"), key=os.path.getmtime)
+        if existing:
+            return existing[-1]
+    return f"{prefix}_{datetime.now().strftime('%Y%m%d_%H%M%S')}_checkpoint.jsonl"
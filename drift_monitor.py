@@ -0,0 +1,152 @@
+import time
+import numpy as np
+from sweep_engine import mean_and_std
+
+
+class DriftEstimator:
+    """
+    Online linear fit of baseline readings against time.
+
+    Every new reading multiplies the weight of the older ones by
+    `forgetting`, so the fit follows drift that changes speed. offset(t) is
+    the fitted baseline at time t relative to the first reading.
+    """
+
+    def __init__(self, forgetting=0.8):
+        self.forgetting = forgetting
+        self.reset()
+
+    def reset(self):
+        self.reference = None
+        self.t0 = None
+        # Weighted sums of 1, t, t², y and t·y
+        self._sums = np.zeros(5)
+        self.history = []
+
+    def add(self, t, value):
+        if self.reference is None:
+            self.reference, self.t0 = value, t
+        dt = t - self.t0
+        self._sums = self.forgetting * self._sums + np.array([1.0, dt, dt * dt, value, dt * value])
+        self.history.append((t, value))
+
+    def fit(self):
+        """(baseline at the first reading's time, rate per second) of the weighted fit"""
+        w, wt, wtt, wy, wty = self._sums
+        if w == 0:
+            return 0.0, 0.0
+        det = w * wtt - wt * wt
+        if det <= 1e-12 * w * wtt:
+            # A single reading, or all at the same time: no slope yet
+            return wy / w, 0.0
+        rate = (w * wty - wt * wy) / det
+        return (wy - rate * wt) / w, rate
+
+    @property
+    def rate(self):
+        return self.fit()[1]
+
+    def offset(self, t):
+        """Fitted baseline at time(s) t minus the first reading, 0 before any reading"""
+        if self.reference is None:
+            return 0.0 * np.asarray(t)
+        intercept, rate = self.fit()
+        return intercept + rate * (np.asarray(t) - self.t0) - self.reference
+
+
+class DriftMonitor:
+    """
+    Tracks the drift of a baseline measured at a reference setpoint between loops.
+
+    check() calls apply_reference(), waits settle_time and feeds
+    measure_baseline() into a DriftEstimator. drift is then the fitted
+    offset from the first check, and exceeded tells whether it or the
+    drift rate (per second) passed its threshold; the run is then paused.
+    rezero() restarts from the next check, e.g. after fixing the setup.
+    correct() subtracts the offset expected at a reading's time, so data
+    can be corrected while it streams.
+    """
+
+    def __init__(self, apply_reference, measure_baseline, threshold, rate_threshold=None,
+                 every=1, settle_time=0.5, forgetting=0.8):
+        self.apply_reference = apply_reference
+        self.measure_baseline = measure_baseline
+        self.threshold = threshold
+        self.rate_threshold = rate_threshold
+        self.every = every
+        self.settle_time = settle_time
+        self.estimator = DriftEstimator(forgetting)
+        self.drift = 0.0
+        self.exceeded = False
+
+    def due(self, loop):
+        """True for the loops (counted from 1) before which the baseline is measured"""
+        return (loop - 1) % self.every == 0
+
+    def check(self):
+        """Measures the baseline and returns the updated drift"""
+        self.apply_reference()
+        time.sleep(self.settle_time)
+        value = self.measure_baseline()
+        t = time.time()
+        self.estimator.add(t, value)
+        self.drift = float(self.estimator.offset(t))
+        rate = self.estimator.rate
+        self.exceeded = abs(self.drift) > self.threshold or (
+            self.rate_threshold is not None and abs(rate) > self.rate_threshold)
+        return self.drift
+
+    def offset(self, t=None):
+        return float(self.estimator.offset(time.time() if t is None else t))
+
+    def correct(self, value, t=None):
+        return value - self.offset(t)
+
+    def rezero(self):
+        self.estimator.reset()
+        self.drift = 0.0
+        self.exceeded = False
+
+    def format_status(self):
+        return (f"Drift: {self.drift:+.3e} ({self.estimator.rate:+.2e}/s) after "
+                f"{len(self.estimator.history)} baselines" + (" - threshold exceeded" if self.exceeded else ""))
+
+
+def b2900_monitor(pbz, b2900, threshold, reference_current=0.0, reference_bias=0.0, samples=5, interval=0.0,
+                  retry_policy=None, **options):
+    """
+    DriftMonitor of the B2900 voltage at a reference PBZ current and B2900 bias.
+
+    Both sources are set, so the baseline never includes the bias times the
+    sample resistance of whatever point came before; the sweep writes the
+    bias again at its next point.
+    """
+    call = retry_policy.call if retry_policy is not None else (lambda func, *args: func(*args))
+
+    def apply_reference():
+        call(pbz.set_current, reference_current)
+        call(b2900.apply_current, reference_bias)
+
+    def measure():
+        readings = []
+        for _ in range(samples):
+            time.sleep(interval)
+            readings.append(call(b2900.measure_voltage))
+        return mean_and_std(readings)[0]
+
+    return DriftMonitor(apply_reference, measure, threshold, **options)
+
+
+def lockin_monitor(pbz, sr, threshold, reference_current=0.0, samples=5, interval=0.0,
+                   retry_policy=None, **options):
+    """DriftMonitor of the lock-in X offset at a reference PBZ current"""
+    call = retry_policy.call if retry_policy is not None else (lambda func, *args: func(*args))
+
+    def measure():
+        readings = []
+        for _ in range(samples):
+            time.sleep(interval)
+            readings.append(call(sr.snap_measurements, 'x', 'y')[0])
+        return mean_and_std(readings)[0]
+
+    return DriftMonitor(lambda: call(pbz.set_current, reference_current), measure, threshold, **options)
@@ -0,0 +1,158 @@
+import csv
+import numpy as np
+
+# Record columns shared with sweep_engine.HysteresisSweep.FIELDS
+LOOP, FORWARD, PBZ_CURRENT, KEYSIGHT_CURRENT, VOLTAGE, VOLTAGE_STD = range(6)
+
+METRIC_FIELDS = (
+    "loop",
+    "coercive_forward", "coercive_backward",
+    "remanence_forward", "remanence_backward",
+    "offset", "area", "offset_drift", "coercive_drift",
+)
+
+
+def records_from_entries(entries, measured_current=True, drift_corrected=True):
+    """
+    Converts MeasurementApp data tuples (with 'Forward'/'Backward') to a float record array.
+
+    With measured_current the PBZ current column holds the read-back output
+    current where the entry has one, instead of the setpoint. With
+    drift_corrected the entry's drift estimate is subtracted from the voltage.
+    """
+    if len(entries) == 0:
+        return np.empty((0, 6))
+    loops = np.array([entry[0] for entry in entries], dtype=float)
+    forward = np.array([entry[1] == "Forward" for entry in entries], dtype=float)
+    values = np.array([entry[2:6] for entry in entries], dtype=float)
+    if measured_current:
+        measured = np.array([entry[6] if len(entry) > 6 else np.nan for entry in entries], dtype=float)
+        values[:, 0] = np.where(np.isnan(measured), values[:, 0], measured)
+    if drift_corrected:
+        values[:, 2] -= np.array([entry[8] if len(entry) > 8 else 0.0 for entry in entries], dtype=float)
+    return np.column_stack([loops, forward, values])
+
+
+def branch_arrays(records):
+    """
+    Splits records into per-loop branches.
+
+    Returns (loops, currents, voltages) where currents and voltages have
+    shape (n_loops, 2, n_points): branch 0 is forward, branch 1 backward,
+    in measurement order and NaN-padded if a branch is incomplete.
+    """
+    records = np.asarray(records, dtype=float)
+    loops, loop_index = np.unique(records[:, LOOP], return_inverse=True)
+    group = loop_index * 2 + (records[:, FORWARD] == 0)
+    order = np.argsort(group, kind="stable")
+    group = group[order]
+    counts = np.bincount(group, minlength=2 * len(loops))
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    position = np.arange(len(group)) - starts[group]
+
+    n_points = counts.max() if len(counts) else 0
+    currents = np.full((2 * len(loops), n_points), np.nan)
+    voltages = np.full((2 * len(loops), n_points), np.nan)
+    currents[group, position] = records[order, PBZ_CURRENT]
+    voltages[group, position] = records[order, VOLTAGE]
+    shape = (len(loops), 2, n_points)
+    return loops.astype(int), currents.reshape(shape), voltages.reshape(shape)
+
+
+def _first_crossing(y, x):
+    """Linear interpolation of x where each row of y first crosses zero (NaN if it never does)"""
+    y0, y1 = y[..., :-1], y[..., 1:]
+    with np.errstate(invalid="ignore"):
+        crosses = (y0 * y1 <= 0) & (y0 != y1)
+    found = crosses.any(axis=-1)
+    i = np.expand_dims(crosses.argmax(axis=-1), -1)
+    ya, yb = np.take_along_axis(y0, i, -1)[..., 0], np.take_along_axis(y1, i, -1)[..., 0]
+    xa, xb = np.take_along_axis(x[..., :-1], i, -1)[..., 0], np.take_along_axis(x[..., 1:], i, -1)[..., 0]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        result = xa + (0 - ya) * (xb - xa) / (yb - ya)
+    return np.where(found, result, np.nan)
+
+
+def loop_metrics(records, reference=None):
+    """
+    Computes hysteresis metrics for every loop in `records`, all loops at once.
+
+    Per loop: offset is the mid-level of the voltage, coercive currents are
+    where each branch crosses the offset, remanence is each branch's voltage
+    at zero PBZ current relative to the offset, and area is the signed loop
+    integral of V dI. Drifts are relative to `reference` (offset, mean
+    coercive current), by default those of the first loop.
+    Returns a structured array with METRIC_FIELDS.
+    """
+    loops, currents, voltages = branch_arrays(records)
+    metrics = np.zeros(len(loops), dtype=[(name, float) for name in METRIC_FIELDS])
+    if len(loops) == 0:
+        return metrics
+
+    offset = (np.nanmax(voltages, axis=(1, 2)) + np.nanmin(voltages, axis=(1, 2))) / 2
+    centred = voltages - offset[:, None, None]
+    coercive = _first_crossing(centred, currents)
+    remanence = _first_crossing(currents, centred)
+
+    # Trapezoids over both branches; the backward branch runs in -dI, closing the loop
+    segments = 0.5 * (voltages[..., 1:] + voltages[..., :-1]) * np.diff(currents, axis=-1)
+    area = np.nansum(segments, axis=(1, 2))
+
+    if reference is None:
+        reference = (offset[0], np.nanmean(coercive[0]))
+    metrics["loop"] = loops
+    metrics["coercive_forward"], metrics["coercive_backward"] = coercive[:, 0], coercive[:, 1]
+    metrics["remanence_forward"], metrics["remanence_backward"] = remanence[:, 0], remanence[:, 1]
+    metrics["offset"] = offset
+    metrics["area"] = area
+    metrics["offset_drift"] = offset - reference[0]
+    metrics["coercive_drift"] = np.nanmean(coercive, axis=1) - reference[1]
+    return metrics
+
+
+class LoopAnalyzer:
+    """
+    Keeps loop metrics up to date while a run is in progress.
+
+    Call add_loop() with the records of each loop as it finishes; only that
+    loop is analysed, against the reference of the first loop.
+    """
+
+    def __init__(self):
+        self._chunks = []
+        self.reference = None
+
+    def add_loop(self, records):
+        """Analyses one finished loop and returns its metrics row"""
+        metrics = loop_metrics(records, self.reference)
+        if self.reference is None and len(metrics):
+            self.reference = (metrics["offset"][0],
+                              np.nanmean([metrics["coercive_forward"][0], metrics["coercive_backward"][0]]))
+        self._chunks.append(metrics)
+        return metrics[-1] if len(metrics) else None
+
+    def metrics(self):
+        if not self._chunks:
+            return np.zeros(0, dtype=[(name, float) for name in METRIC_FIELDS])
+        if len(self._chunks) > 1:
+            self._chunks = [np.concatenate(self._chunks)]
+        return self._chunks[0]
+
+    def clear(self):
+        self._chunks = []
+        self.reference = None
+
+
+def format_metrics(row):
+    """One-line summary of a loop's metrics for the GUI"""
+    return (f"Loop {int(row['loop'])}: Hc+ {row['coercive_forward']:.4e} A, Hc- {row['coercive_backward']:.4e} A | "
+            f"Vr+ {row['remanence_forward']:.4e} V, Vr- {row['remanence_backward']:.4e} V | "
+            f"Area {row['area']:.4e} | Drift {row['offset_drift']:.2e} V, {row['coercive_drift']:.2e} A")
+
+
+def save_metrics(filename, metrics):
+    with open(filename, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(METRIC_FIELDS)
+        for row in metrics:
+            writer.writerow([int(row[0]), *row.tolist()[1:]])
@@ -0,0 +1,129 @@
+import time
+from pyvisa import constants
+
+# IEEE 488.2 status byte bits
+STB_EAV = 0x04  # error/event queue not empty
+STB_MAV = 0x10  # message (measurement) available
+STB_ESB = 0x20  # standard event status summary
+
+# Standard event status register bits
+ESR_OPC = 0x01  # operation complete
+ESR_QYE = 0x04  # query error
+ESR_DDE = 0x08  # device dependent error
+ESR_EXE = 0x10  # execution error
+ESR_CME = 0x20  # command error
+ESR_ERRORS = ESR_QYE | ESR_DDE | ESR_EXE | ESR_CME
+
+EVENTS = ("operation_complete", "measurement_available", "error")
+
+
+class EventMonitor:
+    """
+    Service-request driven status handling for a PBZController or B2900Controller.
+
+    configure() sets the *ESE/*SRE masks so that the instrument raises SRQ on
+    operation complete and on errors. wait() then blocks on the VISA SRQ
+    event, or polls *STB? on a serial PBZ link, and dispatches callbacks
+    registered with on(). Errors are drained from the error queue only when
+    the instrument flags them, instead of with an extra query per command.
+    """
+
+    def __init__(self, controller, sre_mask=STB_ESB | STB_EAV, ese_mask=ESR_OPC | ESR_ERRORS,
+                 poll_interval=0.01):
+        self.controller = controller
+        self.sre_mask = sre_mask
+        self.ese_mask = ese_mask
+        self.poll_interval = poll_interval
+        self.callbacks = {event: [] for event in EVENTS}
+        self.errors = []
+        self._visa = getattr(controller, "connection_type", "USB") in ["USB", "GPIB"]
+        if hasattr(controller, "send_command"):
+            self._write, self._query = controller.send_command, controller.query
+        else:
+            self._write, self._query = controller.instrument.write, controller.instrument.query
+
+    def on(self, event, callback):
+        """Registers callback(event, detail) for one of EVENTS"""
+        if event not in EVENTS:
+            raise ValueError(f"Event must be one of {', '.join(EVENTS)}.")
+        self.callbacks[event].append(callback)
+
+    def configure(self):
+        self._write("*CLS")
+        self._write(f"*ESE {self.ese_mask}")
+        self._write(f"*SRE {self.sre_mask}")
+        if self._visa:
+            self.controller.instrument.enable_event(constants.EventType.service_request,
+                                                    constants.EventMechanism.queue)
+
+    def close(self):
+        if self._visa:
+            self.controller.instrument.disable_event(constants.EventType.service_request,
+                                                     constants.EventMechanism.queue)
+        self._write("*SRE 0")
+
+    def read_status_byte(self):
+        """Serial poll over VISA (no query round trip on GPIB), *STB? over RS232C"""
+        if self._visa:
+            return self.controller.instrument.read_stb()
+        return int(self._query("*STB?"))
+
+    def _dispatch(self, event, detail=None):
+        for callback in self.callbacks[event]:
+            callback(event, detail)
+
+    def handle(self, status_byte=None):
+        """Reads and clears the status registers and dispatches; returns the events that fired"""
+        if status_byte is None:
+            status_byte = self.read_status_byte()
+        fired = []
+        esr = int(self._query("*ESR?")) if status_byte & STB_ESB else 0
+        if esr & ESR_OPC:
+            fired.append("operation_complete")
+            self._dispatch("operation_complete", esr)
+        if status_byte & STB_EAV or esr & ESR_ERRORS:
+            for error in self.drain_errors():
+                fired.append("error")
+                self._dispatch("error", error)
+        if status_byte & STB_MAV:
+            fired.append("measurement_available")
+            self._dispatch("measurement_available", status_byte)
+        return fired
+
+    def drain_errors(self):
+        """Reads the error queue until it reports no error"""
+        errors = []
+        for _ in range(100):
+            error = self.controller.read_error().strip()
+            if error.lstrip("+").startswith("0"):
+                break
+            errors.append(error)
+        self.errors.extend(errors)
+        return errors
+
+    def wait(self, timeout=10.0):
+        """Blocks until the instrument requests service, then handles it; returns the events"""
+        if self._visa:
+            response = self.controller.instrument.wait_on_event(
+                constants.EventType.service_request, int(timeout * 1000), capture_timeout=True)
+            if response.timed_out:
+                return []
+            return self.handle()
+        deadline = time.perf_counter() + timeout
+        while time.perf_counter() < deadline:
+            status_byte = int(self._query("*STB?"))
+            if status_byte & self.sre_mask:
+                return self.handle(status_byte)
+            time.sleep(self.poll_interval)
+        return []
+
+    def wait_complete(self, timeout=10.0):
+        """Sends *OPC and blocks exactly until the pending operations have finished"""
+        self._write("*OPC")
+        deadline = time.perf_counter() + timeout
+        while True:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                raise TimeoutError("Instrument did not report operation complete in time.")
+            if "operation_complete" in self.wait(remaining):
+                return
@@ -0,0 +1,256 @@
+import argparse
+import json
+import socket
+import subprocess
+import sys
+import threading
+import numpy as np
+from multiprocessing import shared_memory
+
+# Header: write count, capacity, number of fields, then the field names as JSON
+_HEADER_INTS = 3
+_NAMES_BYTES = 1024
+_HEADER_BYTES = _HEADER_INTS * 8 + _NAMES_BYTES
+
+
+def _attach_untracked(name):
+    """Opens an existing segment without letting this process's exit delete it."""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Python < 3.13 always registers the segment with the resource tracker
+        from multiprocessing import resource_tracker
+        shm = shared_memory.SharedMemory(name=name)
+        resource_tracker.unregister(shm._name, "shared_memory")
+        return shm
+
+
+class RingBuffer:
+    """
+    A ring of float64 point records in shared memory.
+
+    One acquisition process publishes rows; any number of viewer processes
+    attach by name and read the rows they have not seen yet. The write
+    count is only advanced after a row is complete, and readers that fall
+    more than `capacity` rows behind skip the overwritten rows.
+    """
+
+    def __init__(self, shm, owner):
+        self.shm = shm
+        self.owner = owner
+        self._header = np.ndarray((_HEADER_INTS,), dtype=np.int64, buffer=shm.buf)
+        self.capacity, n_fields = int(self._header[1]), int(self._header[2])
+        names = bytes(shm.buf[_HEADER_INTS * 8:_HEADER_BYTES]).rstrip(b"\0")
+        self.fields = tuple(json.loads(names.decode()))
+        self.rows = np.ndarray((self.capacity, n_fields), dtype=np.float64, buffer=shm.buf, offset=_HEADER_BYTES)
+
+    @classmethod
+    def create(cls, fields, capacity=65536, name=None):
+        names = json.dumps(list(fields)).encode()
+        if len(names) > _NAMES_BYTES:
+            raise ValueError("Too many field names for the ring buffer header.")
+        shm = shared_memory.SharedMemory(name=name, create=True, size=_HEADER_BYTES + capacity * len(fields) * 8)
+        header = np.ndarray((_HEADER_INTS,), dtype=np.int64, buffer=shm.buf)
+        header[:] = (0, capacity, len(fields))
+        shm.buf[_HEADER_INTS * 8:_HEADER_INTS * 8 + len(names)] = names
+        return cls(shm, owner=True)
+
+    @classmethod
+    def attach(cls, name):
+        return cls(_attach_untracked(name), owner=False)
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    @property
+    def count(self):
+        """Number of rows published so far"""
+        return int(self._header[0])
+
+    def publish(self, row):
+        count = int(self._header[0])
+        self.rows[count % self.capacity] = row
+        self._header[0] = count + 1
+
+    def read_since(self, seen):
+        """Returns (rows published after the first `seen`, new seen count)"""
+        count = self.count
+        start = max(seen, count - self.capacity)
+        if start >= count:
+            return np.empty((0, self.rows.shape[1])), count
+        index = np.arange(start, count) % self.capacity
+        rows = self.rows[index]
+        # Rows the writer overwrote while we were copying are dropped, including
+        # the slot of the row it may be writing now (count is advanced after it)
+        overwritten = self.count - self.capacity + 1 - start
+        if overwritten > 0:
+            rows = rows[overwritten:]
+        return rows, count
+
+    def close(self):
+        self._header = None
+        self.rows = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+class ControlServer:
+    """
+    Accepts line commands (pause, resume, stop, ...) on a local TCP socket.
+
+    Each command is dispatched to its handler on the server thread and
+    answered with "ok" or "unknown command".
+    """
+
+    def __init__(self, handlers, port=0):
+        self.handlers = dict(handlers)
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._socket.bind(("127.0.0.1", port))
+        self._socket.listen()
+        self.port = self._socket.getsockname()[1]
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+        self._thread.start()
+
+    def _serve(self):
+        while True:
+            try:
+                connection, _ = self._socket.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._handle, args=(connection,), daemon=True).start()
+
+    def _handle(self, connection):
+        with connection, connection.makefile("rw") as stream:
+            for line in stream:
+                handler = self.handlers.get(line.strip().lower())
+                if handler is None:
+                    stream.write("unknown command\n")
+                else:
+                    handler()
+                    stream.write("ok\n")
+                stream.flush()
+
+    def close(self):
+        self._socket.close()
+
+
+def send_control(port, command, timeout=5.0):
+    """Sends one control command to a ControlServer and returns its reply."""
+    with socket.create_connection(("127.0.0.1", port), timeout=timeout) as connection:
+        connection.sendall(f"{command}\n".encode())
+        return connection.makefile().readline().strip()
+
+
+class LivePublisher:
+    """
+    Publishes a sweep_engine sweep to viewer processes.
+
+    Every recorded row goes into a RingBuffer and pause/resume/stop arrive
+    over a ControlServer, so the sweep never waits on a GUI.
+    """
+
+    def __init__(self, sweep, capacity=65536, port=0):
+        self.sweep = sweep
+        self.ring = RingBuffer.create(sweep.FIELDS, capacity)
+        self.control = ControlServer({"pause": sweep.pause, "resume": sweep.resume, "stop": sweep.stop}, port)
+        sweep.point_callbacks.append(lambda sweep, row: self.ring.publish(row))
+
+    def launch_viewer(self, x_field=None, y_field=None):
+        """Starts a viewer process attached to this publisher"""
+        return launch_viewer(self.ring.name, self.control.port, x_field, y_field)
+
+    def close(self):
+        self.control.close()
+        self.ring.close()
+
+
+def launch_viewer(ring_name, port=None, x_field=None, y_field=None):
+    command = [sys.executable, __file__, ring_name]
+    if port is not None:
+        command += ["--port", str(port)]
+    if x_field:
+        command += ["--x", x_field]
+    if y_field:
+        command += ["--y", y_field]
+    return subprocess.Popen(command)
+
+
+def run_viewer(ring_name, port=None, x_field=None, y_field=None, interval_ms=50):
+    """Live plot of a RingBuffer, split into forward/backward curves when the rows have a direction"""
+    import pyqtgraph as pg
+    from pyqtgraph.Qt import QtWidgets, QtCore
+    from sweep_engine import default_plot_fields
+
+    ring = RingBuffer.attach(ring_name)
+    fields = ring.fields
+    default_x, default_y = default_plot_fields(fields)
+    x_index = fields.index(x_field or default_x)
+    y_index = fields.index(y_field or default_y)
+    forward_index = fields.index("forward") if "forward" in fields else None
+
+    app = QtWidgets.QApplication.instance() or QtWidgets.QApplication(sys.argv)
+    win = QtWidgets.QMainWindow()
+    win.setWindowTitle(f"Live viewer - {ring_name}")
+    win.resize(900, 600)
+    central_widget = QtWidgets.QWidget()
+    win.setCentralWidget(central_widget)
+    layout = QtWidgets.QVBoxLayout(central_widget)
+
+    graphics_layout = pg.GraphicsLayoutWidget()
+    layout.addWidget(graphics_layout)
+    plot = graphics_layout.addPlot(title=f"{fields[y_index]} vs {fields[x_index]}")
+    plot.showGrid(x=True, y=True)
+    plot.setLabel('bottom', fields[x_index])
+    plot.setLabel('left', fields[y_index])
+    forward_curve = plot.plot(pen='b', symbol='o')
+    backward_curve = plot.plot(pen='r', symbol='x')
+
+    controls = QtWidgets.QHBoxLayout()
+    layout.addLayout(controls)
+    status_label = QtWidgets.QLabel("")
+    if port is not None:
+        for command in ("pause", "resume", "stop"):
+            button = QtWidgets.QPushButton(command.capitalize())
+            button.clicked.connect(lambda _, c=command: status_label.setText(f"{c}: {send_control(port, c)}"))
+            controls.addWidget(button)
+    controls.addWidget(status_label)
+
+    state = {"seen": 0, "rows": np.empty((0, len(fields)))}
+
+    def poll():
+        rows, state["seen"] = ring.read_since(state["seen"])
+        if not len(rows):
+            return
+        data = np.concatenate([state["rows"], rows])
+        if forward_index is None:
+            # At most one ring's worth of rows is kept and drawn
+            data = state["rows"] = data[-ring.capacity:]
+            forward_curve.setData(data[:, x_index], data[:, y_index])
+        else:
+            # Only the loop being measured is kept and drawn, like in MeasurementApp
+            current = state["rows"] = data[data[:, 0] == data[-1, 0]]
+            forward = current[:, forward_index] == 1
+            forward_curve.setData(current[forward, x_index], current[forward, y_index])
+            backward_curve.setData(current[~forward, x_index], current[~forward, y_index])
+        status_label.setText(f"{state['seen']} points")
+
+    timer = QtCore.QTimer()
+    timer.timeout.connect(poll)
+    timer.start(interval_ms)
+    win.show()
+    result = app.exec_()
+    ring.close()
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Live plot of a running sweep")
+    parser.add_argument("ring_name")
+    parser.add_argument("--port", type=int, default=None)
+    parser.add_argument("--x", default=None)
+    parser.add_argument("--y", default=None)
+    args = parser.parse_args()
+    sys.exit(run_viewer(args.ring_name, args.port, args.x, args.y))
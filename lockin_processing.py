@@ -0,0 +1,184 @@
+import numpy as np
+
+# Record columns shared with pbz_sr.Plotter.all_data and sweep_engine.LockinSweep.FIELDS
+REPEAT, CURRENT, X, X_STD, Y, Y_STD = range(6)
+
+
+def _std(std, like):
+    return np.zeros_like(like) if std is None else np.asarray(std, dtype=float)
+
+
+def to_polar(x, y, x_std=None, y_std=None, unwrap=True, axis=-1):
+    """
+    Converts X/Y to R and θ (degrees) with first-order error propagation.
+
+    With unwrap the phase is made continuous along `axis`, so it does not
+    jump by 360° when the signal passes ±180°. Returns (r, r_std, theta, theta_std).
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    x_std, y_std = _std(x_std, x), _std(y_std, y)
+    r = np.hypot(x, y)
+    theta = np.arctan2(y, x)
+    if unwrap and theta.size:
+        theta = np.unwrap(theta, axis=axis)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        r_std = np.sqrt((x * x_std) ** 2 + (y * y_std) ** 2) / r
+        theta_std = np.sqrt((y * x_std) ** 2 + (x * y_std) ** 2) / r ** 2
+    return r, r_std, np.degrees(theta), np.degrees(theta_std)
+
+
+def best_phase(x, y, method="variance"):
+    """
+    Reference phase (degrees) that puts the signal into X.
+
+    "mean" maximises the mean of X, for a signal that keeps its sign;
+    "variance" aligns X with the principal axis of the X/Y cloud, which also
+    works for signals that change sign along the sweep.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    if method == "mean":
+        return float(np.degrees(np.arctan2(np.nansum(y), np.nansum(x))))
+    if method == "variance":
+        sxx, syy, sxy = np.nansum(x * x), np.nansum(y * y), np.nansum(x * y)
+        phase = 0.5 * np.arctan2(2 * sxy, sxx - syy)
+        # Of the two principal directions pick the one with positive mean X
+        if np.nansum(x * np.cos(phase) + y * np.sin(phase)) < 0:
+            phase += np.pi
+        return float((np.degrees(phase) + 180.0) % 360.0 - 180.0)
+    raise ValueError("method must be 'mean' or 'variance'.")
+
+
+def rotate(x, y, phase, x_std=None, y_std=None):
+    """
+    Rotates X/Y by `phase` degrees, as if the reference phase had been shifted by it.
+
+    Returns (x, x_std, y, y_std); stds assume independent X and Y noise.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    x_std, y_std = _std(x_std, x), _std(y_std, y)
+    c, s = np.cos(np.radians(phase)), np.sin(np.radians(phase))
+    xr = x * c + y * s
+    yr = -x * s + y * c
+    xr_std = np.sqrt((c * x_std) ** 2 + (s * y_std) ** 2)
+    yr_std = np.sqrt((s * x_std) ** 2 + (c * y_std) ** 2)
+    return xr, xr_std, yr, yr_std
+
+
+def subtract_baseline(current, x, y, x_std=None, y_std=None, groups=None, zero=0.0, tolerance=None,
+                      open_last=False):
+    """
+    Subtracts the X/Y measured at zero current.
+
+    The baseline is the mean of the points whose current is within
+    `tolerance` of `zero` (by default the points closest to it), taken per
+    group (e.g. per repeat) when `groups` is given. Its uncertainty is added
+    in quadrature. With open_last, the group of the last point may still be
+    measuring and have no point at zero yet; its values are then NaN instead
+    of an error. Returns (x, x_std, y, y_std).
+    """
+    current = np.asarray(current, dtype=float)
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    x_std, y_std = _std(x_std, x), _std(y_std, y)
+    distance = np.abs(current - zero)
+    if tolerance is None:
+        tolerance = np.nanmin(distance) if distance.size else 0.0
+    at_zero = distance <= tolerance
+
+    if groups is None:
+        index = np.zeros(len(x), dtype=np.int64)
+    else:
+        _, index = np.unique(np.asarray(groups), return_inverse=True)
+    n_groups = index.max() + 1 if len(index) else 0
+    counts = np.bincount(index, weights=at_zero, minlength=n_groups)
+    missing = counts == 0
+    if open_last and len(index):
+        missing[index[-1]] = False
+    if np.any(missing):
+        raise ValueError("Every group needs at least one point at zero current.")
+
+    def baseline(values, stds):
+        # A group without a point at zero gets a NaN baseline
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = np.bincount(index, weights=np.where(at_zero, values, 0.0), minlength=n_groups) / counts
+            var = np.bincount(index, weights=np.where(at_zero, stds ** 2, 0.0), minlength=n_groups) / counts ** 2
+        return values - mean[index], np.sqrt(stds ** 2 + var[index])
+
+    x, x_std = baseline(x, x_std)
+    y, y_std = baseline(y, y_std)
+    return x, x_std, y, y_std
+
+
+def normalize_harmonic(r, theta, harmonic, excitation=1.0, r_std=None, theta_std=None):
+    """
+    Normalises an n-th harmonic signal: R / excitation**n and θ / n.
+
+    The n-th harmonic response to an excitation of amplitude a scales as a**n
+    and its phase advances n times faster than the reference, so this puts
+    different harmonics and drive levels on a common scale.
+    Returns (r, r_std, theta, theta_std).
+    """
+    if harmonic < 1:
+        raise ValueError("harmonic must be at least 1.")
+    scale = float(excitation) ** harmonic
+    r = np.asarray(r, dtype=float) / scale
+    theta = np.asarray(theta, dtype=float) / harmonic
+    r_std = _std(r_std, r) / scale
+    theta_std = _std(theta_std, theta) / harmonic
+    return r, r_std, theta, theta_std
+
+
+def process(records, harmonic=1, excitation=1.0, phase=None, baseline=True, baseline_per_repeat=True):
+    """
+    Full post-processing of lock-in sweep records, all in vectorized passes.
+
+    records has the Plotter / LockinSweep columns (repeat, current, x, x_std,
+    y, y_std). phase is a rotation in degrees, "mean"/"variance" to pick the
+    one that maximises X, or None to keep the measured phase. Returns a dict
+    of arrays: repeat, current, x, x_std, y, y_std, r, r_std, theta,
+    theta_std and the applied phase; the arrays are empty when there are no
+    records yet. While a sweep runs, the repeat being measured has NaN
+    values until it has reached zero current.
+    """
+    records = np.asarray(records, dtype=float)
+    if records.size == 0:
+        records = records.reshape(0, Y_STD + 1)
+    repeat, current = records[:, REPEAT], records[:, CURRENT]
+    x, x_std, y, y_std = records[:, X], records[:, X_STD], records[:, Y], records[:, Y_STD]
+
+    if baseline:
+        x, x_std, y, y_std = subtract_baseline(
+            current, x, y, x_std, y_std, groups=repeat if baseline_per_repeat else None, open_last=True)
+    if isinstance(phase, str):
+        phase = best_phase(x, y, method=phase)
+    if phase is not None:
+        x, x_std, y, y_std = rotate(x, y, phase, x_std, y_std)
+
+    r, r_std, theta, theta_std = to_polar(x, y, x_std, y_std)
+    r, r_std, theta, theta_std = normalize_harmonic(r, theta, harmonic, excitation, r_std, theta_std)
+    return {
+        "repeat": repeat, "current": current,
+        "x": x, "x_std": x_std, "y": y, "y_std": y_std,
+        "r": r, "r_std": r_std, "theta": theta, "theta_std": theta_std,
+        "phase": 0.0 if phase is None else phase,
+    }
+
+
+def process_buffer(x, y, harmonic=1, excitation=1.0, phase=None):
+    """
+    Processes raw X/Y samples, e.g. an SR830 data buffer read, without stds.
+
+    Returns a dict with x, y, r, theta and the applied phase.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    if isinstance(phase, str):
+        phase = best_phase(x, y, method=phase)
+    if phase is not None:
+        x, _, y, _ = rotate(x, y, phase)
+    r, _, theta, _ = to_polar(x, y)
+    r, _, theta, _ = normalize_harmonic(r, theta, harmonic, excitation)
+    return {"x": x, "y": y, "r": r, "theta": theta, "phase": 0.0 if phase is None else phase}
@@ -0,0 +1,321 @@
+import multiprocessing as mp
+import os
+import queue
+import time
+import traceback
+from datetime import datetime
+
+
+class Rig:
+    """
+    One measurement station.
+
+    kind is "pbz_b2900" (PBZ + B2900, HysteresisSweep) or "pbz_sr"
+    (PBZ + SR830, LockinSweep); only the resources of that kind are needed.
+    """
+
+    KINDS = ("pbz_b2900", "pbz_sr")
+
+    def __init__(self, name, kind, pbz_resource, b2900_resource=None, sr_address=None,
+                 pbz_connection_type="USB"):
+        if kind not in self.KINDS:
+            raise ValueError(f"Rig kind must be one of {', '.join(self.KINDS)}.")
+        if kind == "pbz_b2900" and b2900_resource is None:
+            raise ValueError("A pbz_b2900 rig needs a b2900_resource.")
+        if kind == "pbz_sr" and sr_address is None:
+            raise ValueError("A pbz_sr rig needs an sr_address.")
+        self.name = name
+        self.kind = kind
+        self.pbz_resource = pbz_resource
+        self.b2900_resource = b2900_resource
+        self.sr_address = sr_address
+        self.pbz_connection_type = pbz_connection_type
+
+
+class Job:
+    """
+    One experiment: the sweep keyword arguments for the rig's engine.
+
+    A job with rig=None runs on the first free rig of its kind.
+    """
+
+    def __init__(self, expt_name, kind, params, rig=None):
+        if kind not in Rig.KINDS:
+            raise ValueError(f"Job kind must be one of {', '.join(Rig.KINDS)}.")
+        self.expt_name = expt_name
+        self.kind = kind
+        self.params = dict(params)
+        self.rig = rig
+
+
+def _connect(rig):
+    # Instrument drivers are imported and opened inside the worker process
+    from pbz60 import PBZController
+    pbz = PBZController(connection_type=rig.pbz_connection_type, resource=rig.pbz_resource)
+    if rig.kind == "pbz_b2900":
+        from b2900 import B2900Controller
+        return pbz, B2900Controller(address=rig.b2900_resource)
+    from sr830 import SR830Wrapper
+    return pbz, SR830Wrapper(name=f"lockin_{rig.name}", address=rig.sr_address)
+
+
+def _enable_outputs(rig, pbz, other):
+    pbz.set_mode("CC")
+    pbz.set_current(0)
+    pbz.enable_output()
+    if rig.kind == "pbz_b2900":
+        other.set_source_mode("CURR")
+        other.apply_current(0)
+        other.set_voltage_compliance(10)
+        other.set_output(True)
+
+
+def _disable_outputs(rig, pbz, other):
+    # Each instrument on its own, so one that fails does not leave the other on
+    try:
+        pbz.set_current(0)
+        pbz.disable_output()
+    except Exception as e:
+        print(f"[{rig.name}] Error turning the PBZ output off: {e}")
+    if rig.kind == "pbz_b2900":
+        try:
+            other.apply_current(0)
+            other.set_output(False)
+        except Exception as e:
+            print(f"[{rig.name}] Error turning the B2900 output off: {e}")
+
+
+def _shutdown(rig, pbz, other, invalidate=False):
+    """
+    Closes the rig's instruments. With invalidate, the pooled VISA sessions
+    are closed too, so that the next connection opens fresh ones instead
+    of getting a broken session back.
+    """
+    import visa_pool
+    for instrument in (pbz, other):
+        if instrument is None:
+            continue
+        try:
+            instrument.close()
+        except Exception as e:
+            print(f"[{rig.name}] Error during cleanup: {e}")
+    if invalidate:
+        if rig.pbz_connection_type in ("USB", "GPIB"):
+            visa_pool.close(rig.pbz_resource)
+        if rig.kind == "pbz_b2900":
+            visa_pool.close(rig.b2900_resource)
+
+
+def _run_job(rig, job, pbz, other, data_dir, stop_event, status_queue):
+    from sweep_engine import HysteresisSweep, LockinSweep
+    if rig.kind == "pbz_b2900":
+        sweep = HysteresisSweep(pbz, other, **job.params)
+    else:
+        sweep = LockinSweep(pbz, other, **job.params)
+    sweep.stop_event = stop_event
+
+    def report(sweep, row):
+        status_queue.put(("progress", rig.name, job.expt_name, sweep.count, sweep.total_points, time.time()))
+
+    sweep.point_callbacks.append(report)
+    try:
+        sweep.run()
+    finally:
+        # Whatever was measured is kept, even if the sweep failed halfway
+        filename = os.path.join(
+            data_dir, f"{job.expt_name}_{rig.name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv")
+        sweep.save_csv(filename)
+    return filename
+
+
+def _worker(rig, inbox, status_queue, data_dir, stop_event):
+    """Worker process of one rig: runs the jobs it receives until it gets None."""
+    pbz = other = None
+    try:
+        while True:
+            job = inbox.get()
+            if job is None:
+                break
+            status_queue.put(("started", rig.name, job.expt_name, time.time()))
+            connected = False
+            try:
+                if pbz is None:
+                    pbz, other = _connect(rig)
+                try:
+                    _enable_outputs(rig, pbz, other)
+                    connected = True
+                    filename = _run_job(rig, job, pbz, other, data_dir, stop_event, status_queue)
+                finally:
+                    # Outputs are off between jobs, whatever happened
+                    _disable_outputs(rig, pbz, other)
+                status_queue.put(("done", rig.name, job.expt_name, filename, time.time()))
+            except Exception:
+                # A job that never reached the sweep goes back to the queue for another rig
+                status_queue.put(("failed", rig.name, job.expt_name, traceback.format_exc(), not connected,
+                                  time.time()))
+                # Reconnect from scratch for the next job, on new VISA sessions
+                _shutdown(rig, pbz, other, invalidate=True)
+                pbz = other = None
+    finally:
+        if pbz is not None:
+            _disable_outputs(rig, pbz, other)
+            _shutdown(rig, pbz, other)
+
+
+class Orchestrator:
+    """
+    Runs queued jobs on several rigs, one worker process per rig.
+
+    A rig is handed the next matching job as soon as it becomes free. A job
+    that fails is reported and the rig moves on, except that a job whose rig
+    could not even connect is queued again; a rig is taken out of
+    service after max_failures consecutive failures or if its process dies,
+    without affecting the other rigs.
+    """
+
+    def __init__(self, rigs, data_dir="data", max_failures=2):
+        names = [rig.name for rig in rigs]
+        if len(set(names)) != len(names):
+            raise ValueError("Rig names must be unique.")
+        self.rigs = {rig.name: rig for rig in rigs}
+        self.data_dir = data_dir
+        self.max_failures = max_failures
+        self.pending = []
+        self.results = {}
+        self.rig_status = {
+            name: {"state": "idle", "job": None, "progress": 0, "total": 0,
+                   "last_seen": None, "failures": 0, "completed": 0}
+            for name in self.rigs
+        }
+        self._ctx = mp.get_context("spawn")
+        self._stop_event = self._ctx.Event()
+        self._status_queue = self._ctx.Queue()
+        self._inboxes = {}
+        self._assigned = {}
+        self._processes = {}
+
+    def submit(self, job):
+        """Queues a job; jobs are handed out in submission order."""
+        if job.rig is not None:
+            if job.rig not in self.rigs:
+                raise ValueError(f"Unknown rig {job.rig}.")
+            if self.rigs[job.rig].kind != job.kind:
+                raise ValueError(f"Rig {job.rig} cannot run {job.kind} jobs.")
+        elif not any(rig.kind == job.kind for rig in self.rigs.values()):
+            raise ValueError(f"No rig can run {job.kind} jobs.")
+        self.pending.append(job)
+
+    def stop(self):
+        """Stops the running sweeps after their current point and drops pending jobs."""
+        self.pending.clear()
+        self._stop_event.set()
+
+    def _start_workers(self):
+        os.makedirs(self.data_dir, exist_ok=True)
+        for name, rig in self.rigs.items():
+            inbox = self._ctx.Queue()
+            process = self._ctx.Process(
+                target=_worker, args=(rig, inbox, self._status_queue, self.data_dir, self._stop_event),
+                name=f"rig-{name}", daemon=True)
+            process.start()
+            self._inboxes[name] = inbox
+            self._processes[name] = process
+
+    def _dispatch(self):
+        for name, status in self.rig_status.items():
+            if status["state"] != "idle":
+                continue
+            rig = self.rigs[name]
+            for job in self.pending:
+                if job.kind == rig.kind and job.rig in (None, name):
+                    self.pending.remove(job)
+                    status.update(state="busy", job=job.expt_name, progress=0, total=0)
+                    self._assigned[name] = job
+                    self._inboxes[name].put(job)
+                    break
+
+    def _handle(self, message):
+        kind, rig_name, expt_name = message[:3]
+        status = self.rig_status[rig_name]
+        status["last_seen"] = message[-1]
+        if kind == "progress":
+            status["progress"], status["total"] = message[3], message[4]
+        elif kind == "done":
+            self._assigned.pop(rig_name)
+            self.results[(rig_name, expt_name)] = {"ok": True, "file": message[3]}
+            status.update(state="idle", job=None, failures=0, completed=status["completed"] + 1)
+        elif kind == "failed":
+            job = self._assigned.pop(rig_name)
+            print(f"[{rig_name}] {expt_name} failed:\n{message[3]}")
+            if message[4] and job.rig is None:
+                self.pending.insert(0, job)
+            else:
+                self.results[(rig_name, expt_name)] = {"ok": False, "error": message[3]}
+            status["failures"] += 1
+            status.update(job=None, state="out of service" if status["failures"] >= self.max_failures else "idle")
+
+    def _check_health(self):
+        for name, process in self._processes.items():
+            status = self.rig_status[name]
+            if not process.is_alive() and status["state"] not in ("out of service", "stopped"):
+                if status["job"] is not None:
+                    self._assigned.pop(name)
+                    self.results[(name, status["job"])] = {"ok": False, "error": "worker process died"}
+                status.update(state="out of service", job=None)
+
+    def _busy(self):
+        if any(s["state"] == "busy" for s in self.rig_status.values()):
+            return True
+        # Pending jobs only count while some rig can still take them
+        return any(
+            self.rig_status[name]["state"] == "idle" and job.kind == rig.kind and job.rig in (None, name)
+            for job in self.pending for name, rig in self.rigs.items())
+
+    def format_status(self):
+        """One line per rig: state, job and progress."""
+        lines = []
+        for name, s in self.rig_status.items():
+            progress = f"{s['progress']}/{s['total']}" if s["total"] else "-"
+            lines.append(f"{name:>12} | {s['state']:<14} | {s['job'] or '-':<20} | {progress:>11} | "
+                         f"done: {s['completed']} | failures: {s['failures']}")
+        lines.append(f"{len(self.pending)} job(s) pending")
+        return "\n".join(lines)
+
+    def run(self, poll_interval=1.0, on_status=None):
+        """
+        Runs all submitted jobs and returns {(rig, expt_name): result}.
+
+        on_status(orchestrator) is called every poll_interval seconds to show
+        progress, by default printing format_status().
+        """
+        self._start_workers()
+        next_report = 0.0
+        try:
+            while True:
+                self._dispatch()
+                if not self._busy():
+                    break
+                try:
+                    self._handle(self._status_queue.get(timeout=poll_interval))
+                    while True:
+                        self._handle(self._status_queue.get_nowait())
+                except queue.Empty:
+                    pass
+                self._check_health()
+                if time.time() >= next_report:
+                    (on_status or (lambda o: print(o.format_status())))(self)
+                    next_report = time.time() + poll_interval
+        finally:
+            # Running sweeps end after their current point instead of being terminated
+            self._stop_event.set()
+            for name, inbox in self._inboxes.items():
+                inbox.put(None)
+            for name, process in self._processes.items():
+                process.join(timeout=30)
+                if process.is_alive():
+                    process.terminate()
+                if self.rig_status[name]["state"] == "idle":
+                    self.rig_status[name]["state"] = "stopped"
+        if self.pending:
+            print(f"{len(self.pending)} job(s) could not be run: no rig of their kind is in service.")
+        return self.results
@@ -1,5 +1,6 @@
-import pyvisa
 import serial
+import visa_pool
+from tracing import tracer
 
 class PBZController:
     def __init__(self, connection_type="USB", resource=None, baudrate=9600, timeout=1):
@@ -9,13 +10,14 @@ class PBZController:
         self.connection_type = connection_type.upper()
         self.resource = resource
         self.instrument = None
+        self.reused = False
 
         try:
             if self.connection_type in ["USB", "GPIB"]:
-                rm = pyvisa.ResourceManager()
                 print(f"Trying to connect to {self.resource}...")
-                self.instrument = rm.open_resource(self.resource)
-                print("Connection successful!")
+                self.instrument = visa_pool.open_resource(self.resource)
+                self.reused = self.instrument.reused
+                print("Reusing open session." if self.reused else "Connection successful!")
                 
             elif self.connection_type == "RS232C":
                 self.instrument = serial.Serial(self.resource, baudrate=baudrate, timeout=timeout)
@@ -27,13 +29,47 @@ class PBZController:
 
     def send_command(self, command):
         """Sends a SCPI command to the instrument."""
+        if tracer.enabled:
+            return tracer.call("pbz", command, self._send_command, command)
+        return self._send_command(command)
+
+    def query(self, command):
+        """Sends a SCPI query and returns the response."""
+        if tracer.enabled:
+            return tracer.call("pbz", command, self._query, command)
+        return self._query(command)
+
+    def clear(self):
+        """Device clear: drops pending replies, e.g. the late answer of a timed-out query."""
+        if self.connection_type in ["USB", "GPIB"]:
+            self.instrument.clear()
+        elif self.instrument:
+            self.instrument.reset_input_buffer()
+
+    def encode_command(self, command):
+        """Returns the bytes send_command would put on the bus for `command`."""
+        if self.connection_type in ["USB", "GPIB"]:
+            return f"{command}{self.instrument.write_termination}".encode(self.instrument.encoding)
+        return f"{command}\n".encode()
+
+    def write_raw(self, payload):
+        """Sends a command pre-encoded with encode_command."""
+        if tracer.enabled:
+            return tracer.call("pbz", payload.decode(errors="replace"), self._write_raw, payload)
+        return self._write_raw(payload)
+
+    def _write_raw(self, payload):
+        if self.connection_type in ["USB", "GPIB"]:
+            return self.instrument.write_raw(payload)
+        self.instrument.write(payload)
+
+    def _send_command(self, command):
         if self.connection_type in ["USB", "GPIB"]:
             return self.instrument.write(command)
         elif self.connection_type == "RS232C":
             self.instrument.write(f"{command}\n".encode())
 
-    def query(self, command):
-        """Sends a SCPI query and returns the response."""
+    def _query(self, command):
         if self.connection_type in ["USB", "GPIB"]:
             return self.instrument.query(command)
         elif self.connection_type == "RS232C":
@@ -41,8 +77,8 @@ class PBZController:
             return self.instrument.readline().decode().strip()
 
     def close(self):
-        """Closes the connection to the instrument."""
-        if self.instrument:
+        """Closes the connection to the instrument (pooled VISA sessions stay open)."""
+        if self.connection_type == "RS232C" and self.instrument:
             self.instrument.close()
 
     # --- SCPI Commands ---
@@ -57,6 +93,10 @@ class PBZController:
     def event_status_register(self):
         """ Queries the event status register. """
         return self.query("*ESR?")
+
+    def read_error(self):
+        """Reads the oldest entry of the error queue."""
+        return self.query("SYST:ERR?")
     
     def set_voltage(self, voltage):
         """Sets the output voltage."""
@@ -82,6 +122,26 @@ class PBZController:
         """Measures and returns the output current."""
         return float(self.query("MEAS:CURR?"))
 
+    def configure_readback(self, aperture, function="DC"):
+        """Bus-triggered output measurement averaged over `aperture` seconds."""
+        self.set_measurement_function(function)
+        self.set_measurment_time(min(max(aperture, 0.0001), 3600))
+        self.set_trigger_source("BUS")
+
+    def start_readback(self):
+        """Starts one measurement of the aperture set with configure_readback."""
+        self.send_command("INIT;*TRG")
+
+    def read_output(self):
+        """
+        Returns (current, voltage) of the measurement started by start_readback in one query.
+
+        FETC waits for that measurement to finish and does not start another,
+        so a readback started with the sampling window covers exactly that window.
+        """
+        current, voltage = self.query("FETC:CURR?;:FETC:VOLT?").strip().split(";")
+        return float(current), float(voltage)
+
     def set_mode(self, mode="CV"):
         """
         Sets the device mode (CV or CC).
@@ -182,13 +242,13 @@ class PBZController:
         if not (0.0001 <= time <=3600):
             raise ValueError("Invalid input. Time should belong to the range (0.0001 , 3600)")
         else:
-            self.send_command(f"SENS:APER: {time}")
+            self.send_command(f"SENS:APER {time}")
 
     def set_measurement_function(self,function = "DC"):
         if function not in ["DC" , "AC" , "DCAC" , "PEAK"] :
             raise ValueError("Invalid input. Input should belong to ['DC' , 'AC' , 'DCAC' , 'PEAK']")
         else:
-            self.send_command(f"SENS:FUNC: {function.upper()}")
+            self.send_command(f"SENS:FUNC {function.upper()}")
 
     def set_trigger_delay(self, delay = 0):
         """
@@ -202,9 +262,9 @@ class PBZController:
     def set_trigger_source(self, source = "AUTO"):
         """
         Sets the measurement start trigger source (TRIG:SOUR).
-        Options: AUTO, INT, EXTPOS, EXTNEG.
+        Options: AUTO, INT, BUS, EXTPOS, EXTNEG.
         """
-        valid_sources = ["AUTO", "INT", "EXTPOS", "EXTNEG"]
+        valid_sources = ["AUTO", "INT", "BUS", "EXTPOS", "EXTNEG"]
         if source.upper() not in valid_sources:
             raise ValueError(f"Source must be one of {', '.join(valid_sources)}.")
         command = f"SENS:TRIG:SOUR {source.upper()}"
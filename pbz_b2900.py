@@ -10,6 +10,12 @@ import os
 from datetime import datetime
 from pbz60 import PBZController
 from b2900 import B2900Controller
+from tracing import tracer
+from checkpoint import Checkpoint, RetryPolicy, default_checkpoint_file
+from raw_store import RawSampleStore
+from hysteresis_analysis import LoopAnalyzer, records_from_entries, format_metrics, save_metrics
+from drift_monitor import b2900_monitor
+from sweep_plan import hysteresis_grid, grid_row
 
 class MeasurementApp:
     def __init__(self, pbz_resource, b2900_resource, 
@@ -17,7 +23,11 @@ class MeasurementApp:
                  steps_per_sweep, number_of_loops,
                  sampling_points, time_of_sleep,
                  keysight_current_values,  # Constant keysight_current_values passed here
-                 note_string="", expt_name= ""):
+                 note_string="", expt_name= "",
+                 checkpoint_file=None, resume=False, overwrite_checkpoint=False, retry_policy=None,
+                 raw_store_file=None, pbz_readback=False, measurement_profile=None,
+                 drift_threshold=None, drift_rate_threshold=None, drift_every=1, bias_grid=False,
+                 pulsed_bias=None):
         
         # Configuration parameters
         self.pbz_start_current = pbz_start_current
@@ -30,12 +40,45 @@ class MeasurementApp:
         self.expt_name = expt_name
         # Constant keysight currents passed to the class
         self.keysight_current_values = keysight_current_values
+        # With bias_grid every keysight current gets number_of_loops complete loops
+        # (see sweep_plan.hysteresis_grid) instead of following the PBZ step index
+        self.bias_grid = bias_grid
+        self.total_loops = number_of_loops * (len(keysight_current_values) if bias_grid else 1)
+
+        # Checkpointing and retry of transient bus errors
+        # A default name is unique per run, so a fresh start never truncates an earlier checkpoint
+        self.default_checkpoint = checkpoint_file is None
+        if checkpoint_file is None:
+            checkpoint_file = default_checkpoint_file(expt_name, resume)
+        self.checkpoint = Checkpoint(checkpoint_file)
+        self.resume = resume
+        self.overwrite_checkpoint = overwrite_checkpoint
+        self.retry_policy = retry_policy or RetryPolicy(clear=self.clear_instruments)
+
+        # Optional archive of every raw B2900 sample
+        self.raw_store_file = raw_store_file
+        self.raw_store = None
+
+        # Read back the PBZ output current and voltage at every point
+        self.pbz_readback = pbz_readback
+
+        # B2900 speed/accuracy profile; its sample time is taken out of time_of_sleep
+        self.measurement_profile = measurement_profile
+        self.sample_interval = time_of_sleep
+
+        # B2900Controller.pulsed_sweep timing options (e.g. {"width": 1e-3}): the bias is
+        # then only applied as sampling_points pulses per point instead of held through the settle
+        self.pulsed_bias = dict(pulsed_bias) if pulsed_bias else None
+
+        # Per-loop hysteresis metrics, updated as each loop finishes
+        self.loop_analyzer = LoopAnalyzer()
         
         # Initialize state variables
         self.all_data = []
         self.current_loop_data = []  # Data for the current loop only
         self.current_loop = 0
         self.pbz_currents = np.linspace(pbz_start_current, pbz_end_current, steps_per_sweep)
+        self.plan = hysteresis_grid(self.pbz_currents, keysight_current_values, number_of_loops) if bias_grid else None
         self.running = False
         self.index = 0
         self.forward = True  # Direction flag
@@ -46,18 +89,39 @@ class MeasurementApp:
 
         # Connect to instruments
         self.connect_instruments(pbz_resource, b2900_resource)
+
+        # Baseline at zero PBZ and B2900 current between loops; pauses the run on too much drift
+        self.drift_monitor = None
+        if drift_threshold is not None:
+            self.drift_monitor = b2900_monitor(
+                self.pbz, self.b2900, drift_threshold, samples=sampling_points, interval=self.sample_interval,
+                retry_policy=self.retry_policy, rate_threshold=drift_rate_threshold, every=drift_every)
         self.voltage_source = "b2900"  # Fixed to B2900
         # Initialize UI
         self.setup_ui()
         
+    def clear_instruments(self):
+        """Device clear of both instruments before a retry, so a late reply is not read as the next one"""
+        self.pbz.clear()
+        self.b2900.clear()
+
     def measure_voltage(self):
-        """Measure voltage output of the B2900"""
-        try:
-            voltage = float(self.instr.query("MEAS:VOLT?").strip())
-            return voltage
-        except Exception as e:
-            print(f"Error measuring B2900 voltage: {e}")
-            return float('nan')
+        """Measure voltage output of the B2900, retrying transient bus errors"""
+        return self.retry_policy.call(self.b2900.measure_voltage)
+
+    def checkpoint_config(self):
+        """Sweep configuration stored with the checkpoint to validate a resume"""
+        config = {
+            "pbz_start_current": self.pbz_start_current,
+            "pbz_end_current": self.pbz_end_current,
+            "steps_per_sweep": self.steps_per_sweep,
+            "number_of_loops": self.number_of_loops,
+            "keysight_current_values": list(self.keysight_current_values),
+        }
+        # Only stored when set, so checkpoints of index-paired runs still resume
+        if self.bias_grid:
+            config["bias_grid"] = True
+        return config
 
     def connect_instruments(self, pbz_resource, b2900_resource):
         """Connect to the PBZ60 and B2900 instruments"""
@@ -68,20 +132,29 @@ class MeasurementApp:
             self.b2900 = B2900Controller(address=b2900_resource)
             print(f"B2900 connected: {self.b2900.get_id()}")
             
-            # Initial instrument setup
-            self.pbz.reset()
-            self.b2900.reset()
-            time.sleep(1)
+            # Initial instrument setup; sessions reused from a previous run
+            # in this process keep their state and skip the reset
+            if not (self.pbz.reused and self.b2900.reused):
+                self.pbz.reset()
+                self.b2900.reset()
+                time.sleep(1)
             
             # Set up PBZ
             self.pbz.set_mode("CC")  # Constant Current mode
             self.pbz.set_current(0)  # Start at 0 current
             self.pbz.enable_output()
+            if self.pbz_readback:
+                # Averages over the same window as the B2900 samples
+                self.pbz.configure_readback(self.sampling_points * self.time_of_sleep)
             
             # Set up B2900 for measurements
             self.b2900.set_source_mode("CURR")  # Set to current source mode
             self.b2900.apply_current(0)  # Start at 0 current
             self.b2900.set_voltage_compliance(10)  # Set voltage compliance
+            if self.measurement_profile:
+                sample_time = self.b2900.apply_measurement_profile(self.measurement_profile)
+                self.sample_interval = max(0.0, self.time_of_sleep - sample_time)
+                print(f"B2900 '{self.measurement_profile}' profile: {sample_time * 1e3:.1f} ms per sample")
             self.b2900.set_output(True)
             
         except Exception as e:
@@ -106,7 +179,7 @@ class MeasurementApp:
         top_info_layout = QtWidgets.QHBoxLayout()
         layout.addLayout(top_info_layout)
 
-        self.info_label = QtWidgets.QLabel(f"Loop: {self.current_loop}/{self.number_of_loops} | Direction: {'Forward' if self.forward else 'Backward'}")
+        self.info_label = QtWidgets.QLabel(f"Loop: {self.current_loop}/{self.total_loops} | Direction: {'Forward' if self.forward else 'Backward'}")
         self.info_label.setStyleSheet("font-weight: bold; font-size: 16px; color: blue;")
         top_info_layout.addWidget(self.info_label)
 
@@ -146,6 +219,14 @@ class MeasurementApp:
         self.stats_label.setStyleSheet("font-weight: bold;")
         layout.addWidget(self.stats_label)
 
+        # Loop metrics label
+        self.analysis_label = QtWidgets.QLabel("Loop metrics: ")
+        layout.addWidget(self.analysis_label)
+
+        # Drift label
+        self.drift_label = QtWidgets.QLabel("")
+        layout.addWidget(self.drift_label)
+
         # Connect buttons
         self.start_btn.clicked.connect(self.start_measurement)
         self.stop_btn.clicked.connect(self.stop_measurement)
@@ -173,6 +254,10 @@ class MeasurementApp:
         for entry in self.current_loop_data:
             loop, direction, pbz_curr, key_curr = entry[0:4]
             voltage = entry[4]  # b2900_voltage_mean
+            if len(entry) > 6 and not np.isnan(entry[6]):
+                pbz_curr = entry[6]  # measured PBZ output current
+            if len(entry) > 8:
+                voltage -= entry[8]  # drift correction
                 
             if direction == "Forward":
                 forward_pbz.append(pbz_curr)
@@ -185,6 +270,26 @@ class MeasurementApp:
         self.forward_curve.setData(forward_pbz, forward_voltage)
         self.backward_curve.setData(backward_pbz, backward_voltage)
 
+    def clear_plots(self):
+        """Clear the plotted curves and the data of the current loop"""
+        self.current_loop_data = []
+        self.forward_curve.setData([], [])
+        self.backward_curve.setData([], [])
+
+    def save_current_loop_plot(self):
+        """Export the plot of the current loop"""
+        image_dir = "plots"
+        os.makedirs(image_dir, exist_ok=True)
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        filename = os.path.join(image_dir, f"{self.expt_name}_loop{self.current_loop}_{timestamp}.png")
+        pg.exporters.ImageExporter(self.plot_combined).export(filename)
+
+    def analyze_loop(self):
+        """Compute the metrics of the loop that just finished and show them"""
+        row = self.loop_analyzer.add_loop(records_from_entries(self.current_loop_data))
+        if row is not None:
+            self.analysis_label.setText(format_metrics(row))
+
     def measure_next_point(self):
         """Measure the next data point"""
         if not self.running:
@@ -198,26 +303,32 @@ class MeasurementApp:
             
             # If we've completed a full loop (forward and backward)
             if not self.forward:
-                self.info_label.setText(f"Loop: {self.current_loop}/{self.number_of_loops} | Direction: Backward")
+                self.info_label.setText(f"Loop: {self.current_loop}/{self.total_loops} | Direction: Backward")
             else:
-                # Save the current loop's plot before clearing
+                # Analyse the finished loop and save its plot before clearing
+                self.analyze_loop()
                 self.save_current_loop_plot()
                 
                 # Increment loop counter if we've completed a forward and backward sweep
                 self.current_loop += 1
                 
-                if self.current_loop > self.number_of_loops:
+                if self.current_loop > self.total_loops:
                     # We've finished all loops, save and stop
                     self.running = False
+                    self.checkpoint.finish()
+                    if self.raw_store is not None:
+                        self.raw_store.flush()
                     self.save(auto=True)
-                    self.alert_label.setText(f"✅ Measurement completed! All {self.number_of_loops} loops saved.")
+                    self.alert_label.setText(f"✅ Measurement completed! All {self.total_loops} loops saved.")
                     self.stop_btn.setText("Stop")
                     self.save_btn.show()
                     return
                 
                 # Clear plots for the new loop
                 self.clear_plots()
-                self.info_label.setText(f"Loop: {self.current_loop}/{self.number_of_loops} | Direction: Forward")
+                self.info_label.setText(f"Loop: {self.current_loop}/{self.total_loops} | Direction: Forward")
+                if not self.check_drift():
+                    return
             
             self.update_plot()
             QtCore.QTimer.singleShot(100, self.measure_next_point)
@@ -230,25 +341,55 @@ class MeasurementApp:
             # Reverse the array for backward sweep
             pbz_current = self.pbz_currents[-(self.index+1)]
         
-        # Set the current on PBZ
-        self.pbz.set_current(pbz_current)
-        
-        # Set the current on B2900 (Keysight)
-        keysight_current = self.keysight_current_values[self.index % len(self.keysight_current_values)]
-        self.b2900.apply_current(keysight_current)
-        
-        # Allow settling time
-        time.sleep(0.5)
-        
-        # Take voltage measurements
-        b2900_voltage_data = []
-        for _ in range(self.sampling_points):
-            time.sleep(self.time_of_sleep)
+        if self.plan is not None:
+            row = grid_row(self.current_loop, self.forward, self.index, len(self.pbz_currents))
+            keysight_current, pbz_current = self.plan.setpoints[row]
+            # The bias is the outer axis: one bias per number_of_loops loops
+            keysight_index = (self.current_loop - 1) // self.number_of_loops
+        else:
+            keysight_index = self.index % len(self.keysight_current_values)
+            keysight_current = self.keysight_current_values[keysight_index]
+        try:
+            # Set the current on PBZ and B2900 (Keysight)
+            with tracer.phase("set"):
+                self.retry_policy.call(self.pbz.set_current, pbz_current)
+                if self.pulsed_bias is None:
+                    self.retry_policy.call(self.b2900.apply_current, keysight_current)
+                else:
+                    self.retry_policy.call(self.b2900.apply_current, self.pulsed_bias.get("base", 0.0))
             
-            # Measure voltage using B2900
-            if self.voltage_source == "b2900":
-                b2900_voltage = self.b2900.measure_voltage()
-                b2900_voltage_data.append(b2900_voltage)
+            # Allow settling time
+            with tracer.phase("settle"):
+                time.sleep(0.5)
+            
+            # Take voltage measurements
+            b2900_voltage_data = []
+            sample_times = []
+            with tracer.phase("sample"):
+                if self.pbz_readback:
+                    # The PBZ aperture spans the sampling window that starts now
+                    self.retry_policy.call(self.pbz.start_readback)
+                if self.pulsed_bias is not None:
+                    # All samples come from one triggered pulse train
+                    b2900_voltage_data = self.retry_policy.call(lambda: self.b2900.pulsed_sweep(
+                        [keysight_current] * self.sampling_points, **self.pulsed_bias))
+                    sample_times = [time.time()] * len(b2900_voltage_data)
+                else:
+                    for _ in range(self.sampling_points):
+                        time.sleep(self.sample_interval)
+                        
+                        # Measure voltage using B2900
+                        if self.voltage_source == "b2900":
+                            b2900_voltage = self.measure_voltage()
+                            b2900_voltage_data.append(b2900_voltage)
+                            sample_times.append(time.time())
+                if self.pbz_readback:
+                    pbz_current_measured, pbz_voltage = self.retry_policy.call(self.pbz.read_output)
+                else:
+                    pbz_current_measured, pbz_voltage = float("nan"), float("nan")
+        except Exception as e:
+            self.stop_on_error(e)
+            return
 
         # Calculate statistics
         if self.voltage_source == "b2900" and b2900_voltage_data:
@@ -258,82 +399,214 @@ class MeasurementApp:
 
         # Store data
         direction = "Forward" if self.forward else "Backward"
+        drift = self.drift_monitor.offset() if self.drift_monitor is not None else 0.0
+        if self.raw_store is not None:
+            self.raw_store.append((self.current_loop, direction, self.index), sample_times, b2900_voltage_data)
         data_entry = (
             self.current_loop, 
             direction, 
             pbz_current, 
             keysight_current, 
             b2900_voltage_mean,
-            b2900_voltage_std
+            b2900_voltage_std,
+            pbz_current_measured,
+            pbz_voltage,
+            drift
         )
         self.all_data.append(data_entry)
         self.current_loop_data.append(data_entry)
+        self.checkpoint.append(data_entry, {
+            "loop": self.current_loop,
+            "forward": self.forward,
+            "index": self.index + 1,
+            "keysight_index": keysight_index,
+        })
 
         self.update_plot()
         self.stats_label.setText(
             f"PBZ Current: {pbz_current:.4e} | Keysight Current: {keysight_current:.4e} | "
-            f"B2900 Voltage: {b2900_voltage_mean:.4e}±{b2900_voltage_std:.1e} | Direction: {direction}"
+            f"B2900 Voltage: {b2900_voltage_mean:.4e}±{b2900_voltage_std:.1e} | "
+            + (f"PBZ Output: {pbz_current_measured:.4e} A, {pbz_voltage:.4e} V | " if self.pbz_readback else "")
+            + f"Direction: {direction}"
+            + tracer.format_phases()
         )
 
         self.index += 1
         QtCore.QTimer.singleShot(10, self.measure_next_point)
 
+    def stop_on_error(self, e):
+        """Stops the run after the retries of an instrument call are exhausted"""
+        # The checkpoint holds every completed point
+        self.running = False
+        self.checkpoint.close()
+        self.stop_btn.setText("Resume")
+        self.save_btn.show()
+        self.alert_label.setText(
+            f"❌ Stopped at loop {self.current_loop}, point {self.index}: {e}. "
+            f"Restart with resume=True to continue."
+        )
+        print(f"Measurement stopped by instrument error: {e}")
+
+    def check_drift(self):
+        """Measures the drift baseline if due before this loop; pauses the run and returns False on too much drift"""
+        if self.drift_monitor is None or not self.drift_monitor.due(self.current_loop):
+            return True
+        try:
+            # The monitor's instrument calls already go through retry_policy
+            with tracer.phase("drift"):
+                self.drift_monitor.check()
+        except Exception as e:
+            self.stop_on_error(e)
+            return False
+        self.drift_label.setText(self.drift_monitor.format_status())
+        if not self.drift_monitor.exceeded:
+            return True
+        self.running = False
+        if self.raw_store is not None:
+            self.raw_store.flush()
+        self.stop_btn.setText("Resume")
+        self.save_btn.show()
+        self.alert_label.setText(f"⚠ Drift {self.drift_monitor.drift:+.3e} V before loop {self.current_loop}: "
+                                 f"paused. Resume to re-zero and continue.")
+        return False
+
     def start_measurement(self):
-        """Start the measurement sequence"""
+        """Start the measurement sequence, or continue it from the checkpoint in resume mode"""
         self.running = True
         self.save_btn.hide()
         self.index = 0
         self.current_loop = 1
         self.forward = True
         self.all_data.clear()
-        self.current_loop_data.clear()
+        self.loop_analyzer.clear()
         self.clear_plots()
-        self.info_label.setText(f"Loop: {self.current_loop}/{self.number_of_loops} | Direction: Forward")
+        resuming = self.resume and self.checkpoint.exists()
+        if resuming:
+            # An exception must not escape the Start slot: PyQt would abort the process
+            try:
+                self.resume_from_checkpoint()
+            except Exception as e:
+                self.running = False
+                self.alert_label.setText(f"❌ Cannot resume: {e}")
+                return
+        else:
+            if self.default_checkpoint and self.checkpoint.exists():
+                # A fresh start from the GUI keeps the previous run's checkpoint
+                self.checkpoint = Checkpoint(default_checkpoint_file(self.expt_name))
+            try:
+                self.checkpoint.start(self.checkpoint_config(), overwrite=self.overwrite_checkpoint)
+            except ValueError as e:
+                self.running = False
+                self.alert_label.setText(f"❌ {e}")
+                return
+        if self.raw_store_file:
+            if self.raw_store is not None:
+                self.raw_store.close()
+            self.raw_store = RawSampleStore(self.raw_store_file, "a" if resuming else "w")
+        # Later starts from the GUI begin a fresh run
+        self.resume = False
+        if self.drift_monitor is not None:
+            self.drift_monitor.rezero()
+            if self.index == 0 and self.forward and not self.check_drift():
+                return
+        direction = "Forward" if self.forward else "Backward"
+        self.info_label.setText(f"Loop: {self.current_loop}/{self.total_loops} | Direction: {direction}")
         self.alert_label.setText("Measurement in progress...")
         self.stop_btn.setText("Stop")
         self.measure_next_point()
 
+    def resume_from_checkpoint(self):
+        """Restore data and sweep position from the checkpoint and re-apply the last setpoints"""
+        config, entries, state = self.checkpoint.load()
+        if config != self.checkpoint_config():
+            raise ValueError(f"Checkpoint {self.checkpoint.filename} was written for a different sweep")
+        self.all_data.extend(entries)
+        if state is None:
+            return
+        self.current_loop = state["loop"]
+        self.forward = state["forward"]
+        self.index = state["index"]
+        self.current_loop_data = [entry for entry in self.all_data if entry[0] == self.current_loop]
+        finished = [entry for entry in self.all_data if entry[0] < self.current_loop]
+        if finished:
+            self.analysis_label.setText(format_metrics(self.loop_analyzer.add_loop(records_from_entries(finished))))
+
+        # Bring the instruments back to the last completed point so the next
+        # point is approached from the same side as in the original run
+        last_entry = entries[-1]
+        self.retry_policy.call(self.pbz.set_current, last_entry[2])
+        self.retry_policy.call(self.b2900.apply_current, last_entry[3])
+        print(f"Resuming at loop {self.current_loop}, point {self.index} "
+              f"({'Forward' if self.forward else 'Backward'}), {len(entries)} points restored")
+        self.update_plot()
+
     def stop_measurement(self):
         """Stop or resume the measurement"""
         self.running = not self.running
         self.save_btn.setVisible(not self.running)
 
         if not self.running and self.all_data:
-            stats = f"Paused: Loop {self.current_loop}/{self.number_of_loops}"
+            stats = f"Paused: Loop {self.current_loop}/{self.total_loops}"
             self.alert_label.setText(stats)
+        if not self.running and self.raw_store is not None:
+            self.raw_store.flush()
 
         self.stop_btn.setText("Resume" if not self.running else "Stop")
+        if self.running and self.drift_monitor is not None and self.drift_monitor.exceeded:
+            # Paused on drift: the next baseline becomes the new reference
+            self.drift_monitor.rezero()
+            try:
+                with tracer.phase("drift"):
+                    self.drift_monitor.check()
+            except Exception as e:
+                self.stop_on_error(e)
+                return
+            self.drift_label.setText(self.drift_monitor.format_status())
         if self.running:
             self.measure_next_point()
 
+    def extra_columns(self):
+        """(entry index, name) of the optional columns that save() writes"""
+        columns = []
+        if self.pbz_readback:
+            columns += [(6, "PBZ_Current_meas"), (7, "PBZ_Voltage")]
+        if self.drift_monitor is not None:
+            columns.append((8, "B2900_Voltage_drift"))
+        return columns
+
     def save(self, auto=False):
         filename_base = f"{self.expt_name}_measurement_{datetime.now().strftime('%Y%m%d')}_{self.current_loop}"
         csv_file = f"{filename_base}.csv"
         txt_file = f"{filename_base}.txt"
+        extra = self.extra_columns()
 
         with open(csv_file, "w", newline="") as f:
             writer = csv.writer(f)
             writer.writerow([
                 "Loop", "Direction", "PBZ_Current", "Keysight_Current", 
                 "B2900_Voltage", "B2900_Voltage_std", 
-            ])
+            ] + [name for _, name in extra])
             for entry in self.all_data:
-                writer.writerow(entry)
+                writer.writerow(list(entry[:6]) + [entry[i] for i, _ in extra])
+
+        # Loop metrics are stored next to the data
+        metrics = self.loop_analyzer.metrics()
+        if len(metrics):
+            save_metrics(f"{filename_base}_loops.csv", metrics)
 
         with open(txt_file, "w") as f:
             f.write(f"# {self.note_string}\n")
             f.write("Loop\tDirection\tPBZ_Current\tKeysight_Current\t"
-                    "B2900_Voltage\tB2900_Voltage_std\t"
-                    "PBZ_Voltage\tPBZ_Voltage_std\n")
+                    "B2900_Voltage\tB2900_Voltage_std"
+                    + "".join(f"\t{name}" for _, name in extra) + "\n")
             for entry in self.all_data:
                 loop, direction = entry[0:2]
                 pbz, key = entry[2:4]
                 b2900_v, b2900_v_std = entry[4:6]
-                pbz_v, pbz_v_std = entry[6:8]
                 
                 f.write(f"{loop}\t{direction}\t{pbz:.6e}\t{key:.6e}\t"
-                        f"{b2900_v:.6e}\t{b2900_v_std:.6e}\t"
-                        f"{pbz_v:.6e}\t{pbz_v_std:.6e}\n")
+                        f"{b2900_v:.6e}\t{b2900_v_std:.6e}"
+                        + "".join(f"\t{entry[i]:.6e}" for i, _ in extra) + "\n")
 
         # Save current plot if any data exists in current_loop_data
         if self.current_loop_data and not auto:
@@ -364,13 +637,20 @@ class MeasurementApp:
             with open(filename, 'r') as f:
                 lines = f.readlines()
                 start_line = 0
+                header = []
                 
                 # Skip header and comments
                 for i, line in enumerate(lines):
                     if line.startswith("#") or "Loop" in line:
                         start_line = i + 1
+                        if "Loop" in line:
+                            header = line.strip().replace(',', '\t').split('\t')
                         continue
                 
+                # Optional columns are found by name
+                optional = {name: header.index(name) for name in ("PBZ_Current_meas", "PBZ_Voltage", "B2900_Voltage_drift")
+                            if name in header}
+                
                 for line in lines[start_line:]:
                     parts = line.strip().replace(',', '\t').split('\t')
                     if len(parts) >= 6:
@@ -380,8 +660,13 @@ class MeasurementApp:
                         keysight_current = float(parts[3])
                         voltage = float(parts[4])
                         voltage_std = float(parts[5])
+                        values = {name: float(parts[i]) for name, i in optional.items() if i < len(parts)}
+                        pbz_current_measured = values.get("PBZ_Current_meas", float("nan"))
+                        pbz_voltage = values.get("PBZ_Voltage", float("nan"))
+                        drift = values.get("B2900_Voltage_drift", 0.0)
                         
-                        self.all_data.append((loop, direction, pbz_current, keysight_current, voltage, voltage_std))
+                        self.all_data.append((loop, direction, pbz_current, keysight_current, voltage, voltage_std,
+                                              pbz_current_measured, pbz_voltage, drift))
                         
             # Get the latest loop number
             if self.all_data:
@@ -404,6 +689,9 @@ class MeasurementApp:
             self.b2900.apply_current(0)
             self.b2900.set_output(False)
             self.b2900.close()
+
+            if self.raw_store is not None:
+                self.raw_store.close()
         except Exception as e:
             print(f"Error during cleanup: {e}")
 
@@ -8,12 +8,16 @@ import sys
 import csv
 import os
 from datetime import datetime
+from tracing import tracer
+from lockin_processing import process
+from raw_store import RawSampleStore
 
 class Plotter:
     def __init__(self, pbz, sr, start_Current, End_current, number_of_points, number_of_repeats,
-                 sampling_points, time_of_sleep, trace_mode, note_string):
+                 sampling_points, time_of_sleep, trace_mode, note_string, raw_store_file=None, block=True):
 
         self.pbz = pbz
+        # A qcodes SR830 (snap, harmonic), e.g. the .instrument of an sr830.SR830Wrapper
         self.sr = sr
         self.start_Current = start_Current
         self.End_current = End_current
@@ -23,6 +27,9 @@ class Plotter:
         self.time_of_sleep = time_of_sleep
         self.trace_mode = trace_mode
         self.note_string = note_string
+        # Optional archive of every raw X/Y sample
+        self.raw_store_file = raw_store_file
+        self.raw_store = None
 
         self.original_currents = np.linspace(start_Current, End_current, number_of_points)
         self.currents = list(self.original_currents)
@@ -35,10 +42,30 @@ class Plotter:
 
         self.current_values, self.x_means, self.x_stds, self.y_means, self.y_stds = [], [], [], [], []
 
-        self.app = QtWidgets.QApplication(sys.argv)
+        # Reuse the running QApplication, e.g. from an earlier run in the same kernel,
+        # and return instead of exiting the interpreter when the window is closed
+        self.app = QtWidgets.QApplication.instance() or QtWidgets.QApplication(sys.argv)
         self.setup_ui()
+        # With block=False the window is driven by an event loop that is already
+        # running, e.g. %gui qt in Jupyter, and __init__ returns at once
+        self.block = block
+        if block:
+            self.run()
+        else:
+            self.win.show()
+
+    def run(self):
+        """Shows the window and blocks until it is closed"""
+        self.block = True
         self.win.show()
-        sys.exit(self.app.exec_())
+        return self.app.exec_()
+
+    def close_window(self):
+        # Quitting would also stop the event loop of the notebook that drives a non-blocking window
+        if self.block:
+            self.app.quit()
+        else:
+            self.win.close()
 
     def setup_ui(self):
         self.win = QtWidgets.QMainWindow()
@@ -102,11 +129,18 @@ class Plotter:
         self.stop_btn.clicked.connect(self.stop_measurement)
         self.save_btn.clicked.connect(lambda: self.save(auto=False))
         self.load_btn.clicked.connect(self.load_data)
-        self.win.keyPressEvent = lambda e: self.app.quit() if e.key() == QtCore.Qt.Key_Escape else None
+        self.win.keyPressEvent = lambda e: self.close_window() if e.key() == QtCore.Qt.Key_Escape else None
 
     def mean_and_std(self, data):
         return statistics.mean(data), statistics.stdev(data)
 
+    def post_process(self, **options):
+        """R/θ, baseline subtraction and phase rotation of the data so far, see lockin_processing.process"""
+        # Normalize to the harmonic the lock-in is detecting unless told otherwise
+        if "harmonic" not in options:
+            options["harmonic"] = self.sr.harmonic()
+        return process(self.all_data, **options)
+
     def update_plot(self):
         x_np = np.array(self.current_values)
         x_mean_np = np.array(self.x_means)
@@ -128,7 +162,12 @@ class Plotter:
             if self.current_repeat >= self.number_of_repeats:
                 self.running = False
                 self.save(auto=True)
-                self.app.quit()
+                if self.raw_store is not None:
+                    self.raw_store.close()
+                    self.raw_store = None
+                # A non-blocking window stays open to look at the result
+                if self.block:
+                    self.app.quit()
                 return
 
             if self.trace_mode:
@@ -150,13 +189,18 @@ class Plotter:
 
         current = self.currents[self.index]
 
-        self.pbz.set_current(current)
-        x_data, y_data = [], []
-        for _ in range(self.sampling_points):
-            time.sleep(self.time_of_sleep)
-            x, y = self.sr.snap('x', 'y')
-            x_data.append(x)
-            y_data.append(y)
+        with tracer.phase("set"):
+            self.pbz.set_current(current)
+        x_data, y_data, sample_times = [], [], []
+        with tracer.phase("sample"):
+            for _ in range(self.sampling_points):
+                time.sleep(self.time_of_sleep)
+                x, y = self.sr.snap('x', 'y')
+                x_data.append(x)
+                y_data.append(y)
+                sample_times.append(time.time())
+        if self.raw_store is not None:
+            self.raw_store.append((self.current_repeat + 1, self.index), sample_times, np.column_stack([x_data, y_data]))
 
         x_mean, x_std = self.mean_and_std(x_data)
         y_mean, y_std = self.mean_and_std(y_data)
@@ -172,6 +216,7 @@ class Plotter:
         self.update_plot()
         self.stats_label.setText(
             f"Current: {current:.4e} | X: {x_mean:.4e}±{x_std:.1e} | Y: {y_mean:.4e}±{y_std:.1e}"
+            + tracer.format_phases()
         )
 
         self.index += 1
@@ -189,6 +234,10 @@ class Plotter:
         self.y_means.clear()
         self.y_stds.clear()
         self.all_data.clear()
+        if self.raw_store_file:
+            if self.raw_store is not None:
+                self.raw_store.close()
+            self.raw_store = RawSampleStore(self.raw_store_file, "w", channels=2)
         self.info_label.setText(f"Repeat: {self.current_repeat}/{self.number_of_repeats}")
         self.update_plot()
         self.measure_next_point()
@@ -196,6 +245,8 @@ class Plotter:
     def stop_measurement(self):
         self.running = not self.running
         self.save_btn.show()
+        if not self.running and self.raw_store is not None:
+            self.raw_store.flush()
 
         if not self.running and self.x_means and self.y_means:
             stats = (
@@ -0,0 +1,133 @@
+import numpy as np
+
+
+class AxisLimits:
+    """
+    Setting range and resolution of the source that drives one plan axis.
+
+    Setpoints are rounded to `resolution`, or to `digits` significant digits
+    when given (never finer than `resolution`), which is what the instrument
+    would keep of them anyway. `command` is the SCPI template of one write.
+    """
+
+    def __init__(self, minimum, maximum, resolution, command, digits=None):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.resolution = resolution
+        self.command = command
+        self.digits = digits
+
+    def quantize(self, values):
+        values = np.asarray(values, dtype=float)
+        step = np.full(values.shape, float(self.resolution))
+        if self.digits is not None:
+            with np.errstate(divide="ignore"):
+                exponent = np.floor(np.log10(np.abs(values)))
+            relative = 10.0 ** (np.where(np.isfinite(exponent), exponent, 0) - self.digits + 1)
+            step = np.maximum(step, relative)
+        return np.round(values / step) * step
+
+
+# Default limits: PBZ60-6.7, B2901/B2902 DC source and SR830 reference
+LIMITS = {
+    "pbz_current": AxisLimits(-6.7, 6.7, 1e-4, "CURR {}"),
+    "b2900_current": AxisLimits(-3.03, 3.03, 1e-14, ":SOUR:CURR {}", digits=6),
+    "frequency": AxisLimits(0.001, 102000, 1e-4, "FREQ {}", digits=5),
+    "amplitude": AxisLimits(0.004, 5.0, 0.002, "SLVL {}"),
+}
+
+# Instrument driving each axis, as passed to compile_plan
+AXIS_INSTRUMENTS = {"pbz_current": "pbz", "b2900_current": "b2900", "frequency": "sr", "amplitude": "sr"}
+
+
+def _format(value):
+    # Quantized values are exact in 10 significant digits
+    return f"{value:.10g}"
+
+
+def check_plan(plan, limits=None, compliance=None):
+    """
+    Quantizes a SweepPlan and validates every point, without touching an instrument.
+
+    limits overrides entries of LIMITS. compliance maps an axis to
+    (load_resistance, voltage_limit): points where |value| * load_resistance
+    exceeds the voltage limit are rejected. Raises ValueError listing the
+    offending points; returns the quantized setpoints.
+    """
+    limits = {**LIMITS, **(limits or {})}
+    compliance = compliance or {}
+    setpoints = np.empty_like(plan.setpoints)
+    problems = []
+    for k, name in enumerate(plan.axes):
+        axis = limits[name]
+        values = setpoints[:, k] = axis.quantize(plan.setpoints[:, k])
+        bad = np.flatnonzero((values < axis.minimum) | (values > axis.maximum))
+        if len(bad):
+            problems.append(f"{name}: {len(bad)} points outside [{axis.minimum}, {axis.maximum}], "
+                            f"first at point {bad[0]} ({plan.setpoints[bad[0], k]})")
+        if name in compliance:
+            load_resistance, voltage_limit = compliance[name]
+            bad = np.flatnonzero(np.abs(values) * load_resistance > voltage_limit)
+            if len(bad):
+                problems.append(f"{name}: {len(bad)} points need more than {voltage_limit} V across "
+                                f"{load_resistance} Ω, first at point {bad[0]} ({values[bad[0]]})")
+    if problems:
+        raise ValueError("Sweep plan rejected:\n" + "\n".join(problems))
+    return setpoints
+
+
+class CompiledPlan:
+    """
+    A checked SweepPlan with every per-point write encoded ahead of time.
+
+    Has the attributes sweep_engine.PlanSweep uses from a SweepPlan, with
+    quantized setpoints, plus writes(i): the (write, payload) pairs of
+    point i, where write sends the payload bytes unchanged.
+    """
+
+    def __init__(self, plan, setpoints, instruments, limits):
+        self.axes = plan.axes
+        self.setpoints = setpoints
+        self.loop = plan.loop
+        self.forward = plan.forward
+        self.settle = plan.settle
+        # Setpoints that became equal after quantization need no write
+        self.changed = np.diff(setpoints, axis=0, prepend=np.nan) != 0
+        self.instruments = instruments
+
+        self._columns = []
+        for k, name in enumerate(self.axes):
+            instrument = instruments[AXIS_INSTRUMENTS[name]]
+            command = limits[name].command
+            # Formatting and encoding only once per distinct value
+            values, inverse = np.unique(setpoints[:, k], return_inverse=True)
+            payloads = [instrument.encode_command(command.format(_format(value))) for value in values]
+            self._columns.append((instrument.write_raw, payloads, inverse))
+
+    def writes(self, i):
+        return [(write, payloads[inverse[i]]) for k, (write, payloads, inverse) in enumerate(self._columns)
+                if self.changed[i, k]]
+
+    def __len__(self):
+        return len(self.setpoints)
+
+    def column(self, name):
+        return self.setpoints[:, self.axes.index(name)]
+
+    def total_settle_time(self):
+        return float(self.settle.sum())
+
+    def prepare(self):
+        """Puts the sources in the mode the raw writes assume"""
+        if "b2900_current" in self.axes:
+            self.instruments["b2900"].set_source_mode("CURR")
+
+
+def compile_plan(plan, pbz=None, b2900=None, sr=None, limits=None, compliance=None):
+    """Checks a SweepPlan with check_plan and encodes its writes for the given instruments"""
+    instruments = {"pbz": pbz, "b2900": b2900, "sr": sr}
+    missing = [name for name in plan.axes if instruments[AXIS_INSTRUMENTS[name]] is None]
+    if missing:
+        raise ValueError(f"No instrument given for axes: {', '.join(missing)}")
+    setpoints = check_plan(plan, limits, compliance)
+    return CompiledPlan(plan, setpoints, instruments, {**LIMITS, **(limits or {})})
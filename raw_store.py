@@ -0,0 +1,209 @@
+import json
+import os
+import struct
+import zlib
+import numpy as np
+
+_MAGIC = b"RSC2"
+_HEADER = struct.Struct("<4sI")
+
+
+class RawSampleStore:
+    """
+    Compact archive of every raw sample, indexed by point key.
+
+    A key is a tuple such as (loop, direction, point). Samples are stored as
+    float32 values and timestamps delta-encoded to int32 microseconds
+    relative to the point's first sample, and written in zlib-compressed
+    chunks. Every chunk carries the index of the points it holds as a
+    separately compressed block of typed arrays (sample counts, first
+    timestamps and one column per key element, strings as codes into a
+    small table), so an interrupted run stays readable, opening a store only
+    decompresses the index blocks, and load() of one point only decompresses
+    that point's chunk. The JSON header of a chunk only has counts and dtypes.
+    """
+
+    def __init__(self, filename, mode="r", channels=1, chunk_samples=65536, level=6):
+        if mode not in ("r", "w", "a"):
+            raise ValueError("mode must be 'r', 'w' or 'a'.")
+        self.filename = filename
+        self.mode = mode
+        self.channels = channels
+        self.chunk_samples = chunk_samples
+        self.level = level
+        self.index = {}
+        self._chunks = []
+        self._cache = (None, None)
+        self._pending = []
+        self._pending_samples = 0
+        if mode in ("r", "a") and os.path.exists(filename):
+            self._scan()
+        self._file = open(filename, "rb" if mode == "r" else ("wb" if mode == "w" else "ab"))
+
+    @staticmethod
+    def _key(key):
+        return tuple(json.loads(json.dumps(list(key))))
+
+    @staticmethod
+    def _encode_index(keys, counts, t0s):
+        """Index block of a chunk: (compressed bytes, key column dtypes, string table sizes)"""
+        width = len(keys[0])
+        if any(len(key) != width for key in keys):
+            raise ValueError("All keys of a store chunk must have the same length.")
+        parts = [np.asarray(counts, dtype=np.int32).tobytes(), np.asarray(t0s, dtype=np.float64).tobytes()]
+        dtypes, table_sizes = [], []
+        for column in zip(*keys):
+            if all(isinstance(item, str) for item in column):
+                table = sorted(set(column))
+                codes = {item: code for code, item in enumerate(table)}
+                table = "\0".join(table).encode()
+                parts.append(np.array([codes[item] for item in column], dtype=np.uint16).tobytes())
+                parts.append(table)
+                dtypes.append("str")
+                table_sizes.append(len(table))
+            else:
+                array = np.asarray(column)
+                dtype = "<i8" if array.dtype.kind in "bi" else "<f8"
+                parts.append(array.astype(dtype).tobytes())
+                dtypes.append(dtype)
+                table_sizes.append(0)
+        return b"".join(parts), dtypes, table_sizes
+
+    @staticmethod
+    def _decode_index(raw, points, dtypes, table_sizes):
+        """Inverse of _encode_index: (keys, counts, t0s)"""
+        counts = np.frombuffer(raw, dtype=np.int32, count=points)
+        position = counts.nbytes
+        t0s = np.frombuffer(raw, dtype=np.float64, count=points, offset=position)
+        position += t0s.nbytes
+        columns = []
+        for dtype, table_size in zip(dtypes, table_sizes):
+            if dtype == "str":
+                codes = np.frombuffer(raw, dtype=np.uint16, count=points, offset=position)
+                position += codes.nbytes
+                table = raw[position:position + table_size].decode().split("\0")
+                position += table_size
+                columns.append([table[code] for code in codes])
+            else:
+                column = np.frombuffer(raw, dtype=dtype, count=points, offset=position)
+                position += column.nbytes
+                columns.append(column.tolist())
+        return list(zip(*columns)), counts.tolist(), t0s.tolist()
+
+    def _add_chunk(self, data_offset, length, samples, keys, counts, t0s):
+        chunk = len(self._chunks)
+        self._chunks.append((data_offset, length, samples))
+        offset = 0
+        for key, count, t0 in zip(keys, counts, t0s):
+            self.index[key] = (chunk, offset, count, t0)
+            offset += count
+
+    def _scan(self):
+        """Rebuilds the index from the chunk index blocks"""
+        size = os.path.getsize(self.filename)
+        valid_end = 0
+        with open(self.filename, "rb") as f:
+            while True:
+                raw = f.read(_HEADER.size)
+                if len(raw) < _HEADER.size:
+                    break
+                magic, header_length = _HEADER.unpack(raw)
+                if magic != _MAGIC:
+                    raise ValueError(f"{self.filename} is not a raw sample store.")
+                header_bytes = f.read(header_length)
+                if len(header_bytes) < header_length:
+                    break
+                header = json.loads(header_bytes)
+                if f.tell() + header["index_length"] + header["length"] > size:
+                    # Truncated final chunk from an interrupted run
+                    break
+                raw_index = zlib.decompress(f.read(header["index_length"]))
+                data_offset = f.tell()
+                f.seek(header["length"], os.SEEK_CUR)
+                self.channels = header["channels"]
+                keys, counts, t0s = self._decode_index(raw_index, header["points"], header["key_dtypes"],
+                                                       header["key_tables"])
+                self._add_chunk(data_offset, header["length"], header["samples"], keys, counts, t0s)
+                valid_end = f.tell()
+        if self.mode == "a" and valid_end != size:
+            # Drop the truncated tail so appended chunks follow a valid one
+            with open(self.filename, "r+b") as f:
+                f.truncate(valid_end)
+
+    def append(self, key, timestamps, values):
+        """Adds the samples of one point; values has shape (n,) or (n, channels)"""
+        if self.mode == "r":
+            raise ValueError("Store is opened read-only.")
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        values = np.asarray(values, dtype=np.float32).reshape(len(timestamps), self.channels)
+        t0 = float(timestamps[0]) if len(timestamps) else 0.0
+        deltas = np.round((timestamps - t0) * 1e6).astype(np.int32)
+        self._pending.append((self._key(key), t0, deltas, values))
+        self._pending_samples += len(timestamps)
+        if self._pending_samples >= self.chunk_samples:
+            self.flush()
+
+    def flush(self):
+        """Compresses and writes the buffered points as one chunk"""
+        if not self._pending:
+            return
+        keys = [key for key, _, _, _ in self._pending]
+        t0s = [t0 for _, t0, _, _ in self._pending]
+        counts = [len(d) for _, _, d, _ in self._pending]
+        raw_index, dtypes, table_sizes = self._encode_index(keys, counts, t0s)
+        index_payload = zlib.compress(raw_index, self.level)
+        values = np.concatenate([v for _, _, _, v in self._pending])
+        deltas = np.concatenate([d for _, _, d, _ in self._pending])
+        payload = zlib.compress(values.tobytes() + deltas.tobytes(), self.level)
+        samples = len(deltas)
+        header = json.dumps({"points": len(keys), "samples": samples, "channels": self.channels,
+                             "key_dtypes": dtypes, "key_tables": table_sizes,
+                             "index_length": len(index_payload), "length": len(payload)}).encode()
+
+        self._file.write(_HEADER.pack(_MAGIC, len(header)) + header + index_payload)
+        data_offset = self._file.tell()
+        self._file.write(payload)
+        self._file.flush()
+        self._add_chunk(data_offset, len(payload), samples, keys, counts, t0s)
+        self._pending = []
+        self._pending_samples = 0
+
+    def _chunk(self, chunk):
+        cached_chunk, arrays = self._cache
+        if cached_chunk == chunk:
+            return arrays
+        data_offset, length, samples = self._chunks[chunk]
+        if self.mode == "r":
+            f = self._file
+        else:
+            self._file.flush()
+            f = open(self.filename, "rb")
+        try:
+            f.seek(data_offset)
+            raw = zlib.decompress(f.read(length))
+        finally:
+            if f is not self._file:
+                f.close()
+        values = np.frombuffer(raw, dtype=np.float32, count=samples * self.channels).reshape(samples, self.channels)
+        deltas = np.frombuffer(raw, dtype=np.int32, offset=samples * self.channels * 4, count=samples)
+        self._cache = (chunk, (values, deltas))
+        return values, deltas
+
+    def load(self, key):
+        """Returns (timestamps, values) of one point"""
+        key = self._key(key)
+        if key not in self.index:
+            self.flush()
+        chunk, offset, count, t0 = self.index[key]
+        values, deltas = self._chunk(chunk)
+        timestamps = t0 + deltas[offset:offset + count] * 1e-6
+        values = values[offset:offset + count]
+        return timestamps, values[:, 0] if self.channels == 1 else values
+
+    def keys(self):
+        return list(self.index)
+
+    def close(self):
+        if self.mode != "r":
+            self.flush()
+        self._file.close()
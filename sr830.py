@@ -1,7 +1,9 @@
 
 
+import time
 from qcodes.instrument_drivers.stanford_research.SR830 import SR830
 from qcodes.instrument import Instrument
+from tracing import tracer
 
 class SR830Wrapper:
     def __init__(self, name='lockin', address='GPIB0::8::INSTR'):
@@ -10,50 +12,97 @@ class SR830Wrapper:
             del Instrument._all_instruments[name]
         self.instrument = SR830(name, address)
 
+    def _call(self, command, func, *args):
+        """Runs a qcodes call, recording it when tracing is enabled."""
+        if tracer.enabled:
+            return tracer.call("sr830", command, func, *args)
+        return func(*args)
+
+    def encode_command(self, command: str) -> bytes:
+        """Returns the bytes a qcodes set would send for `command`"""
+        handle = self.instrument.visa_handle
+        return f"{command}{handle.write_termination}".encode(handle.encoding)
+
+    def write_raw(self, payload: bytes):
+        """Sends a command pre-encoded with encode_command, bypassing qcodes parameter formatting"""
+        self._call(payload.decode(errors="replace"), self.instrument.visa_handle.write_raw, payload)
+
     # Signal generation and config setters
     def set_sine_out_amplitude(self, voltage: float):
-        self.instrument.amplitude.set(voltage)
+        self._call("amplitude.set", self.instrument.amplitude.set, voltage)
 
     def set_frequency(self, freq: float):
-        self.instrument.frequency.set(freq)
+        self._call("frequency.set", self.instrument.frequency.set, freq)
 
     def set_phase(self, value: float):
-        self.instrument.phase.set(value)
+        self._call("phase.set", self.instrument.phase.set, value)
 
     def set_sensitivity(self, value: str):
-        self.instrument.sensitivity.set(value)
+        self._call("sensitivity.set", self.instrument.sensitivity.set, value)
 
     def set_time_constant(self, value: str):
-        self.instrument.time_constant.set(value)
+        self._call("time_constant.set", self.instrument.time_constant.set, value)
 
     def set_reference_source(self, value: str):
-        self.instrument.reference_source.set(value)
+        self._call("reference_source.set", self.instrument.reference_source.set, value)
 
     def set_harmonic(self, value: int):
-        self.instrument.harmonic.set(value)
+        self._call("harmonic.set", self.instrument.harmonic.set, value)
 
     def set_input_config(self, value: str):
-        self.instrument.input_config.set(value)
+        self._call("input_config.set", self.instrument.input_config.set, value)
 
     def set_input_coupling(self, value: str):
-        self.instrument.input_coupling.set(value)
+        self._call("input_coupling.set", self.instrument.input_coupling.set, value)
 
     def set_ext_trigger(self, value: bool):
-        self.instrument.ext_trigger.set(value)
+        self._call("ext_trigger.set", self.instrument.ext_trigger.set, value)
+
+    # Getters used by the sweeps to cache the instrument state
+    def get_sensitivity(self) -> float:
+        return self._call("sensitivity.get", self.instrument.sensitivity.get)
+
+    def get_time_constant(self) -> float:
+        return self._call("time_constant.get", self.instrument.time_constant.get)
+
+    def get_filter_slope(self) -> int:
+        return self._call("filter_slope.get", self.instrument.filter_slope.get)
+
+    def sensitivity_values(self):
+        """Available sensitivities for the current input configuration, ascending"""
+        # Reading the input configuration sets the sensitivity validator to volts or amperes
+        self.instrument.input_config.get()
+        return sorted(self.instrument.sensitivity.vals.values)
+
+    def time_constant_values(self):
+        return sorted(self.instrument.time_constant.val_mapping)
+
+    def read_overload(self) -> int:
+        """
+        Input/reserve (1), filter (2) and output (4) overload bits latched since the last call.
+        """
+        return int(self._call("LIAS?", self.instrument.ask, "LIAS?")) & 0b111
 
     # Snap function to read multiple parameters in one call
     def snap_measurements(self, *args):
-        return self.instrument.snap(*args)
+        return self._call("snap", self.instrument.snap, *args)
 
     # Auto adjustment functions
     def auto_phase(self):
-        self.instrument.auto_phase()
-
-    def auto_gain(self):
-        self.instrument.auto_gain()
+        self._call("auto_phase", self.instrument.auto_phase)
+
+    def auto_gain(self, wait=False, timeout=30.0):
+        self._call("auto_gain", self.instrument.auto_gain)
+        if wait:
+            # AGAN runs in the background; bit 1 of the status byte is set once it is done
+            deadline = time.perf_counter() + timeout
+            while not int(self.instrument.ask("*STB? 1")):
+                if time.perf_counter() > deadline:
+                    raise TimeoutError(f"Auto gain did not finish within {timeout} s.")
+                time.sleep(0.05)
 
     def auto_reserve(self):
-        self.instrument.auto_reserve()
+        self._call("auto_reserve", self.instrument.auto_reserve)
 
     # Aggregate reading
     def get_all(self):
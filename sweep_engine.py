@@ -0,0 +1,618 @@
+import csv
+import threading
+import time
+import numpy as np
+from checkpoint import RetryPolicy
+from lockin_processing import to_polar
+from sweep_plan import hysteresis_grid, grid_row
+from tracing import tracer
+
+
+def mean_and_std(data):
+    """Mean and sample standard deviation, 0 for a single sample"""
+    data = np.asarray(data, dtype=float)
+    return float(data.mean()), float(data.std(ddof=1)) if len(data) > 1 else 0.0
+
+
+# Columns that group rows, columns the sweeps set, and the rest are readings
+GROUP_FIELDS = ("loop", "forward", "repeat")
+SETPOINT_FIELDS = ("pbz_current", "keysight_current", "b2900_current", "current", "frequency", "amplitude")
+
+
+def default_plot_fields(fields):
+    """(x, y) to plot by default: the first setpoint column and the first reading that is not a std"""
+    x = next((name for name in fields if name in SETPOINT_FIELDS), None)
+    y = next((name for name in fields if name not in GROUP_FIELDS + SETPOINT_FIELDS
+              and not name.endswith("_std")), None)
+    if x is None or y is None:
+        raise ValueError(f"No default plot for fields {', '.join(fields)}; give x and y.")
+    return x, y
+
+
+class Sweep:
+    """
+    Shared state of the headless sweeps.
+
+    Rows are stored in a preallocated float array with columns FIELDS,
+    point_callbacks are called as callback(sweep, row) after every point,
+    and run() checks for stop() and pause() between points. With
+    instrument_events.EventMonitors in `events`, the instruments' operation
+    complete replaces part of the fixed settle time (see _settle). A
+    drift_monitor.DriftMonitor measures its baseline before the loops it
+    is due for and pauses the sweep when the drift is too large.
+    """
+
+    FIELDS = ()
+    drift_monitor = None
+    # Fixed wait after operation complete when `events` are monitored; None keeps the settle time
+    settle_after_complete = None
+
+    def _allocate(self, total_points):
+        self.total_points = total_points
+        self.data = np.full((total_points, len(self.FIELDS)), np.nan)
+        self.count = 0
+        self.stop_event = threading.Event()
+        self._running = threading.Event()
+        self._running.set()
+        self.point_callbacks = []
+        self.events = []
+
+    def _wait_ready(self):
+        """Blocks until every monitored instrument has finished, raising on reported errors"""
+        for monitor in self.events:
+            monitor.wait_complete()
+            if monitor.errors:
+                errors, monitor.errors = monitor.errors, []
+                raise RuntimeError(f"Instrument reported errors: {'; '.join(errors)}")
+
+    def _settle(self, settle_time, set_time):
+        """
+        Waits until the setpoints written at set_time (time.perf_counter()) have settled.
+
+        Without event monitors this is a plain sleep, with no extra queries.
+        With them, it waits for operation complete and then sleeps
+        settle_after_complete if set, else only what is left of settle_time
+        since set_time, so the completion wait never adds to the settle time.
+        """
+        if not self.events:
+            time.sleep(settle_time)
+            return
+        self._wait_ready()
+        if self.settle_after_complete is not None:
+            time.sleep(self.settle_after_complete)
+        else:
+            time.sleep(max(0.0, settle_time - (time.perf_counter() - set_time)))
+
+    def _check_drift(self, group):
+        """Measures the drift baseline before loop/repeat `group`; returns False if stopped while paused"""
+        monitor = self.drift_monitor
+        if monitor is None or not monitor.due(group):
+            return True
+        with tracer.phase("drift"):
+            monitor.check()
+        if monitor.exceeded:
+            print(f"{monitor.format_status()}: sweep paused before {group}, resume to re-zero")
+            self.pause()
+            if not self._proceed():
+                return False
+            monitor.rezero()
+            with tracer.phase("drift"):
+                monitor.check()
+        return True
+
+    def pause(self):
+        """Holds the sweep before its next point"""
+        self._running.clear()
+
+    def resume(self):
+        self._running.set()
+
+    def stop(self):
+        """Ends the sweep after the current point"""
+        self.stop_event.set()
+        self._running.set()
+
+    @property
+    def paused(self):
+        return not self._running.is_set()
+
+    def _proceed(self):
+        """Blocks while paused; returns False once the sweep has to stop"""
+        self._running.wait()
+        return not self.stop_event.is_set()
+
+    def record(self, row):
+        self.data[self.count] = row
+        self.count += 1
+        for callback in self.point_callbacks:
+            callback(self, row)
+
+    def records(self):
+        """View of the rows measured so far"""
+        return self.data[:self.count]
+
+
+class HysteresisSweep(Sweep):
+    """
+    Headless PBZ + B2900 sweep: the MeasurementApp loop without the GUI.
+
+    Each loop sweeps the PBZ current forward then backward while the B2900
+    sources a bias current and measures voltage. Results are kept in a
+    preallocated float array, one row per point, with columns FIELDS.
+    With pbz_readback the PBZ output current and voltage measured over the
+    sampling window are added as two more columns. A B2900 measurement
+    profile sets the integration time, and its expected sample time is
+    taken out of time_of_sleep so the sampling window keeps its length.
+    With a drift_monitor, the estimated drift and the corrected voltage
+    are added as well. With bias_grid, every keysight current is a grid
+    axis (sweep_plan.hysteresis_grid) that gets number_of_loops complete
+    loops, instead of being paired with the PBZ step index. With
+    pulsed_bias (B2900Controller.pulsed_sweep timing options, e.g.
+    {"width": 1e-3}), the B2900 stays at the pulse base while the PBZ
+    settles and each point's samples are sampling_points pulses of the
+    keysight current from one trigger, so the sample only carries the
+    bias during the pulses.
+    """
+
+    FIELDS = ("loop", "forward", "pbz_current", "keysight_current", "b2900_voltage", "b2900_voltage_std")
+    READBACK_FIELDS = ("pbz_current_measured", "pbz_voltage")
+    DRIFT_FIELDS = ("drift", "b2900_voltage_corrected")
+
+    def __init__(self, pbz, b2900, pbz_start_current, pbz_end_current,
+                 steps_per_sweep, number_of_loops, sampling_points, time_of_sleep,
+                 keysight_current_values, settle_time=0.5, retry_policy=None, pbz_readback=False,
+                 measurement_profile=None, drift_monitor=None, bias_grid=False, pulsed_bias=None):
+        self.pbz = pbz
+        self.b2900 = b2900
+        self.pbz_currents = np.linspace(pbz_start_current, pbz_end_current, steps_per_sweep)
+        self.number_of_loops = number_of_loops
+        self.sampling_points = sampling_points
+        self.time_of_sleep = time_of_sleep
+        self.keysight_current_values = list(keysight_current_values)
+        self.plan = None
+        self.total_loops = number_of_loops
+        if bias_grid:
+            self.plan = hysteresis_grid(self.pbz_currents, self.keysight_current_values, number_of_loops)
+            self.total_loops = number_of_loops * len(self.keysight_current_values)
+        self.settle_time = settle_time
+        # Timeouts are retried after a device clear of both instruments
+        self.retry_policy = retry_policy or RetryPolicy(clear=lambda: (pbz.clear(), b2900.clear()))
+        self.pbz_readback = pbz_readback
+        self.pulsed_bias = dict(pulsed_bias) if pulsed_bias else None
+        self.drift_monitor = drift_monitor
+        if pbz_readback:
+            self.FIELDS = self.FIELDS + HysteresisSweep.READBACK_FIELDS
+            pbz.configure_readback(sampling_points * time_of_sleep)
+        if drift_monitor is not None:
+            self.FIELDS = self.FIELDS + HysteresisSweep.DRIFT_FIELDS
+
+        self.sample_time = 0.0
+        if measurement_profile is not None:
+            self.sample_time = b2900.apply_measurement_profile(measurement_profile)
+
+        self._allocate(2 * steps_per_sweep * self.total_loops)
+
+    def points(self):
+        """Yields (loop, forward, index, pbz_current, keysight_current) in sweep order"""
+        steps = len(self.pbz_currents)
+        for loop in range(1, self.total_loops + 1):
+            for forward in (True, False):
+                currents = self.pbz_currents if forward else self.pbz_currents[::-1]
+                for index, pbz_current in enumerate(currents):
+                    if self.plan is not None:
+                        keysight_current, pbz_current = self.plan.setpoints[grid_row(loop, forward, index, steps)]
+                    else:
+                        keysight_current = self.keysight_current_values[index % len(self.keysight_current_values)]
+                    yield loop, forward, index, pbz_current, keysight_current
+
+    def apply(self, pbz_current, keysight_current):
+        set_time = time.perf_counter()
+        self._keysight_current = keysight_current
+        with tracer.phase("set"):
+            self.retry_policy.call(self.pbz.set_current, pbz_current)
+            if self.pulsed_bias is None:
+                self.retry_policy.call(self.b2900.apply_current, keysight_current)
+            else:
+                # The bias is only applied by the pulses in sample()
+                self.retry_policy.call(self.b2900.apply_current, self.pulsed_bias.get("base", 0.0))
+        with tracer.phase("settle"):
+            self._settle(self.settle_time, set_time)
+
+    def sample(self):
+        """Takes sampling_points B2900 voltage readings and returns their mean and std"""
+        if self.pulsed_bias is not None:
+            with tracer.phase("sample"):
+                samples = self.retry_policy.call(lambda: self.b2900.pulsed_sweep(
+                    [self._keysight_current] * self.sampling_points, **self.pulsed_bias))
+            return mean_and_std(samples)
+        samples = []
+        interval = max(0.0, self.time_of_sleep - self.sample_time)
+        with tracer.phase("sample"):
+            for _ in range(self.sampling_points):
+                time.sleep(interval)
+                samples.append(self.retry_policy.call(self.b2900.measure_voltage))
+        return mean_and_std(samples)
+
+    def run(self):
+        """Runs the sweep until done or stopped and returns the recorded rows"""
+        for loop, forward, index, pbz_current, keysight_current in self.points():
+            if forward and index == 0 and not self._check_drift(loop):
+                break
+            if not self._proceed():
+                break
+            self.apply(pbz_current, keysight_current)
+            if self.pbz_readback:
+                # The PBZ aperture spans the sampling window that starts now
+                self.retry_policy.call(self.pbz.start_readback)
+            voltage_mean, voltage_std = self.sample()
+            row = (loop, forward, pbz_current, keysight_current, voltage_mean, voltage_std)
+            if self.pbz_readback:
+                row += self.retry_policy.call(self.pbz.read_output)
+            if self.drift_monitor is not None:
+                drift = self.drift_monitor.offset()
+                row += (drift, voltage_mean - drift)
+            self.record(row)
+        return self.records()
+
+    def save_csv(self, filename):
+        """Writes the rows in the same CSV layout as MeasurementApp.save"""
+        with open(filename, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["Loop", "Direction", "PBZ_Current", "Keysight_Current",
+                             "B2900_Voltage", "B2900_Voltage_std"]
+                            + (["PBZ_Current_meas", "PBZ_Voltage"] if self.pbz_readback else [])
+                            + (["B2900_Voltage_drift", "B2900_Voltage_corrected"] if self.drift_monitor else []))
+            for row in self.records():
+                writer.writerow([int(row[0]), "Forward" if row[1] else "Backward", *row[2:]])
+
+
+class LockinSweep(Sweep):
+    """
+    Headless PBZ + SR830 sweep: the Plotter loop without the GUI.
+
+    With trace_mode every other repeat runs in reverse, as in Plotter.
+    Rows have columns FIELDS, plus the X drift and corrected X with a
+    drift_monitor.
+    """
+
+    FIELDS = ("repeat", "current", "x", "x_std", "y", "y_std")
+    DRIFT_FIELDS = ("drift", "x_corrected")
+
+    def __init__(self, pbz, sr, start_current, end_current, number_of_points,
+                 number_of_repeats, sampling_points, time_of_sleep, trace_mode=False,
+                 retry_policy=None, drift_monitor=None):
+        self.pbz = pbz
+        self.sr = sr
+        self.currents = np.linspace(start_current, end_current, number_of_points)
+        self.number_of_repeats = number_of_repeats
+        self.sampling_points = sampling_points
+        self.time_of_sleep = time_of_sleep
+        self.trace_mode = trace_mode
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.drift_monitor = drift_monitor
+        if drift_monitor is not None:
+            self.FIELDS = LockinSweep.FIELDS + LockinSweep.DRIFT_FIELDS
+
+        self._allocate(number_of_points * number_of_repeats)
+
+    def points(self):
+        """Yields (repeat, index, current) in sweep order"""
+        for repeat in range(1, self.number_of_repeats + 1):
+            reverse = self.trace_mode and repeat % 2 == 0
+            currents = self.currents[::-1] if reverse else self.currents
+            for index, current in enumerate(currents):
+                yield repeat, index, current
+
+    def apply(self, current):
+        set_time = time.perf_counter()
+        with tracer.phase("set"):
+            self.retry_policy.call(self.pbz.set_current, current)
+        # The settle time is the wait before each sample
+        with tracer.phase("settle"):
+            self._settle(0.0, set_time)
+
+    def sample(self):
+        """Takes sampling_points X/Y snaps and returns (x_mean, x_std, y_mean, y_std)"""
+        xs, ys = [], []
+        with tracer.phase("sample"):
+            for _ in range(self.sampling_points):
+                time.sleep(self.time_of_sleep)
+                x, y = self.retry_policy.call(self.sr.snap_measurements, 'x', 'y')
+                xs.append(x)
+                ys.append(y)
+        return (*mean_and_std(xs), *mean_and_std(ys))
+
+    def run(self):
+        """Runs the sweep until done or stopped and returns the recorded rows"""
+        for repeat, index, current in self.points():
+            if index == 0 and not self._check_drift(repeat):
+                break
+            if not self._proceed():
+                break
+            self.apply(current)
+            row = (repeat, current, *self.sample())
+            if self.drift_monitor is not None:
+                drift = self.drift_monitor.offset()
+                row += (drift, row[2] - drift)
+            self.record(row)
+        return self.records()
+
+    def save_csv(self, filename):
+        """Writes the rows in the same CSV layout as Plotter.save"""
+        with open(filename, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["Repeat", "Current", "X", "X_std", "Y", "Y_std"]
+                            + (["X_drift", "X_corrected"] if self.drift_monitor else []))
+            for row in self.records():
+                writer.writerow([int(row[0]), *row[1:]])
+
+
+class FrequencySweep(Sweep):
+    """
+    SR830 frequency response sweep with predicted sensitivity.
+
+    The sensitivity for each frequency is picked from R extrapolated on a
+    log-log scale from the previous two points, with `headroom` to spare,
+    so auto_gain only runs on the first point and when the lock-in reports
+    an overload. The time constant is raised to span at least `min_periods`
+    reference periods at low frequencies, and each point waits for the
+    filter to settle to 99 %. Rows have columns FIELDS; arrays() returns
+    X/Y/R/θ against frequency.
+    """
+
+    FIELDS = ("frequency", "x", "x_std", "y", "y_std", "sensitivity", "time_constant", "autoranged")
+    # Time constants to settle to 99 % for each filter slope in dB/oct (SR830 manual)
+    SETTLE_TIME_CONSTANTS = {6: 5, 12: 7, 18: 9, 24: 10}
+
+    def __init__(self, sr, frequencies, time_constant=None, min_periods=5, sampling_points=1,
+                 headroom=2.0, retry_policy=None):
+        self.sr = sr
+        self.frequencies = np.asarray(frequencies, dtype=float)
+        self.time_constant = time_constant
+        self.min_periods = min_periods
+        self.sampling_points = sampling_points
+        self.headroom = headroom
+        self.retry_policy = retry_policy or RetryPolicy()
+
+        self._allocate(len(self.frequencies))
+
+    @staticmethod
+    def _setting(values, minimum):
+        """Smallest setting not below `minimum`, the largest one if none is"""
+        index = np.searchsorted(values, minimum * (1 - 1e-9))
+        return values[min(index, len(values) - 1)]
+
+    def _read_state(self):
+        """Reads the settings once; afterwards they are only written when they change"""
+        self._sensitivities = self.sr.sensitivity_values()
+        self._time_constants = self.sr.time_constant_values()
+        self._sensitivity = self.retry_policy.call(self.sr.get_sensitivity)
+        self._time_constant = self.retry_policy.call(self.sr.get_time_constant)
+        self._slope = self.retry_policy.call(self.sr.get_filter_slope)
+        if self.time_constant is None:
+            self.time_constant = self._time_constant
+
+    def settle_time(self):
+        return self.SETTLE_TIME_CONSTANTS[self._slope] * self._time_constant
+
+    def predict_r(self, frequency):
+        """R expected at `frequency` from the last two points, None before the first point"""
+        rows = self.records()[-2:]
+        if len(rows) == 0:
+            return None
+        f, r = rows[:, 0], np.hypot(rows[:, 1], rows[:, 3])
+        if len(rows) == 1 or np.any(r <= 0) or f[0] == f[1]:
+            return float(r[-1])
+        slope = np.log(r[1] / r[0]) / np.log(f[1] / f[0])
+        return float(r[1] * (frequency / f[1]) ** slope)
+
+    def apply(self, frequency):
+        """Sets frequency, time constant and predicted sensitivity; returns False if there was no prediction"""
+        time_constant = self._setting(self._time_constants, max(self.time_constant, self.min_periods / frequency))
+        predicted = self.predict_r(frequency)
+        set_time = time.perf_counter()
+        with tracer.phase("set"):
+            self.retry_policy.call(self.sr.set_frequency, frequency)
+            if time_constant != self._time_constant:
+                self.retry_policy.call(self.sr.set_time_constant, time_constant)
+                self._time_constant = time_constant
+            if predicted is not None:
+                sensitivity = self._setting(self._sensitivities, predicted * self.headroom)
+                if sensitivity != self._sensitivity:
+                    self.retry_policy.call(self.sr.set_sensitivity, sensitivity)
+                    self._sensitivity = sensitivity
+        with tracer.phase("settle"):
+            self._settle(self.settle_time(), set_time)
+        return predicted is not None
+
+    def autorange(self):
+        """Falls back to the lock-in's auto gain and caches the sensitivity it picked"""
+        with tracer.phase("autorange"):
+            self.retry_policy.call(self.sr.auto_gain, True)
+            self._sensitivity = self.retry_policy.call(self.sr.get_sensitivity)
+            time.sleep(self.settle_time())
+
+    def sample(self):
+        """Takes sampling_points X/Y snaps one time constant apart and returns (x_mean, x_std, y_mean, y_std)"""
+        xs, ys = [], []
+        # Reading the status clears overloads latched while settling
+        self.retry_policy.call(self.sr.read_overload)
+        with tracer.phase("sample"):
+            for i in range(self.sampling_points):
+                if i:
+                    time.sleep(self._time_constant)
+                x, y = self.retry_policy.call(self.sr.snap_measurements, 'x', 'y')
+                xs.append(x)
+                ys.append(y)
+        return (*mean_and_std(xs), *mean_and_std(ys))
+
+    def overloaded(self, values):
+        x, _, y, _ = values
+        return bool(self.retry_policy.call(self.sr.read_overload)) or np.hypot(x, y) > self._sensitivity
+
+    def run(self):
+        """Runs the sweep until done or stopped and returns the recorded rows"""
+        self._read_state()
+        for frequency in self.frequencies:
+            if not self._proceed():
+                break
+            autoranged = not self.apply(frequency)
+            if autoranged:
+                self.autorange()
+            values = self.sample()
+            if self.overloaded(values) and not autoranged:
+                autoranged = True
+                self.autorange()
+                values = self.sample()
+            self.record((frequency, *values, self._sensitivity, self._time_constant, autoranged))
+        return self.records()
+
+    def arrays(self):
+        """X/Y/R/θ (degrees, unwrapped along the sweep) and their stds against frequency"""
+        rows = self.records()
+        x, x_std, y, y_std = rows[:, 1], rows[:, 2], rows[:, 3], rows[:, 4]
+        r, r_std, theta, theta_std = to_polar(x, y, x_std, y_std)
+        return {
+            "frequency": rows[:, 0],
+            "x": x, "x_std": x_std, "y": y, "y_std": y_std,
+            "r": r, "r_std": r_std, "theta": theta, "theta_std": theta_std,
+        }
+
+    def save_csv(self, filename):
+        arrays = self.arrays()
+        rows = self.records()
+        with open(filename, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["Frequency", "X", "X_std", "Y", "Y_std", "R", "R_std", "Theta", "Theta_std",
+                             "Sensitivity", "Time_Constant", "Autoranged"])
+            columns = [arrays[name] for name in ("frequency", "x", "x_std", "y", "y_std",
+                                                 "r", "r_std", "theta", "theta_std")]
+            for i, values in enumerate(zip(*columns)):
+                writer.writerow([*values, rows[i, 5], rows[i, 6], int(rows[i, 7])])
+
+
+def plan_setters(pbz=None, b2900=None, sr=None):
+    """Maps SweepPlan axis names to the setter of the instrument that drives them"""
+    setters = {}
+    if pbz is not None:
+        setters["pbz_current"] = pbz.set_current
+    if b2900 is not None:
+        setters["b2900_current"] = b2900.apply_current
+    if sr is not None:
+        setters["frequency"] = sr.set_frequency
+        setters["amplitude"] = sr.set_sine_out_amplitude
+    return setters
+
+
+class PlanSweep(Sweep):
+    """
+    Runs a SweepPlan from sweep_plan.SweepPlanner.
+
+    At every point only the axes that changed are written, then the plan's
+    settle time for that point is waited and measure() is called; it must
+    return one value per name in measure_fields. Rows have columns
+    ("loop", "forward", *plan.axes, *measure_fields).
+    A plan_compiler.CompiledPlan needs no setters: its pre-encoded
+    payloads are written as they are.
+    """
+
+    def __init__(self, plan, setters, measure, measure_fields, retry_policy=None):
+        self.compiled = hasattr(plan, "writes")
+        if not self.compiled:
+            missing = [name for name in plan.axes if name not in setters]
+            if missing:
+                raise ValueError(f"No instrument given for axes: {', '.join(missing)}")
+            self.setters = [setters[name] for name in plan.axes]
+        self.plan = plan
+        self.measure = measure
+        self.FIELDS = ("loop", "forward", *plan.axes, *measure_fields)
+        self.retry_policy = retry_policy or RetryPolicy()
+
+        self._allocate(len(plan))
+
+    def apply(self, i):
+        plan = self.plan
+        set_time = time.perf_counter()
+        with tracer.phase("set"):
+            if self.compiled:
+                for write, payload in plan.writes(i):
+                    self.retry_policy.call(write, payload)
+            else:
+                for k, setter in enumerate(self.setters):
+                    if plan.changed[i, k]:
+                        self.retry_policy.call(setter, plan.setpoints[i, k])
+        with tracer.phase("settle"):
+            self._settle(plan.settle[i], set_time)
+
+    def run(self):
+        """Runs the plan from the first unmeasured point until done or stopped"""
+        plan = self.plan
+        if self.compiled:
+            plan.prepare()
+        for i in range(self.count, self.total_points):
+            if not self._proceed():
+                break
+            self.apply(i)
+            with tracer.phase("sample"):
+                values = self.measure()
+            self.record((plan.loop[i], plan.forward[i], *plan.setpoints[i], *values))
+        return self.records()
+
+    def save_csv(self, filename):
+        with open(filename, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(self.FIELDS)
+            for row in self.records():
+                writer.writerow([int(row[0]), "Forward" if row[1] else "Backward", *row[2:]])
+
+
+class PulsedSweep(Sweep):
+    """
+    B2900 pulsed hysteresis or I-V sweep, run as hardware list sweeps.
+
+    Every loop sources the B2900 currents forward then backward as pulses
+    on top of `base`, so the sample only carries the bias during each
+    pulse. Points are sent in lists of up to B2900Controller.LIST_MAX_POINTS,
+    each run from a single trigger; pause and stop act between lists. An
+    optional fixed PBZ current is applied before the first list.
+    """
+
+    FIELDS = ("loop", "forward", "b2900_current", "b2900_voltage")
+
+    def __init__(self, b2900, b2900_currents, number_of_loops, width, delay=0, base=0.0,
+                 measure_delay=None, aperture=None, period=None, pbz=None, pbz_current=None,
+                 retry_policy=None):
+        self.b2900 = b2900
+        self.pbz = pbz
+        self.pbz_current = pbz_current
+        self.pulse = dict(width=width, delay=delay, base=base, measure_delay=measure_delay,
+                          aperture=aperture, period=period)
+        self.retry_policy = retry_policy or RetryPolicy()
+
+        currents = np.asarray(b2900_currents, dtype=float)
+        loop_currents = np.concatenate([currents, currents[::-1]])
+        self.currents = np.tile(loop_currents, number_of_loops)
+        self.loops = np.repeat(np.arange(1, number_of_loops + 1), len(loop_currents))
+        self.forward = np.tile(np.arange(len(loop_currents)) < len(currents), number_of_loops)
+        self._allocate(len(self.currents))
+
+    def run(self):
+        """Runs the remaining points list by list until done or stopped"""
+        if self.pbz is not None and self.pbz_current is not None:
+            self.retry_policy.call(self.pbz.set_current, self.pbz_current)
+        chunk = self.b2900.LIST_MAX_POINTS
+        while self.count < self.total_points and self._proceed():
+            start, end = self.count, min(self.count + chunk, self.total_points)
+            with tracer.phase("pulsed list"):
+                voltages = self.retry_policy.call(
+                    lambda: self.b2900.pulsed_sweep(self.currents[start:end], **self.pulse))
+            for i, voltage in zip(range(start, end), voltages):
+                self.record((self.loops[i], self.forward[i], self.currents[i], voltage))
+        return self.records()
+
+    def save_csv(self, filename):
+        with open(filename, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["Loop", "Direction", "Keysight_Current", "B2900_Voltage"])
+            for row in self.records():
+                writer.writerow([int(row[0]), "Forward" if row[1] else "Backward", *row[2:]])
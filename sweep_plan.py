@@ -0,0 +1,154 @@
+import numpy as np
+
+# Axis names the sweep engines know how to set
+AXIS_NAMES = ("pbz_current", "b2900_current", "frequency", "amplitude")
+
+
+class Axis:
+    """
+    One swept quantity and its grid.
+
+    settle_time is waited after any change of this axis and settle_per_unit
+    adds a delay proportional to the size of the jump. A hysteresis axis is
+    swept forward and back `loops` times for every setting of the other
+    axes, so the sample always sees complete loops.
+    """
+
+    def __init__(self, name, values, settle_time=0.0, settle_per_unit=0.0, hysteresis=False, loops=1):
+        if name not in AXIS_NAMES:
+            raise ValueError(f"Axis name must be one of {', '.join(AXIS_NAMES)}.")
+        values = np.asarray(values, dtype=float)
+        if values.ndim != 1 or len(values) == 0:
+            raise ValueError(f"Axis {name} needs a non-empty 1D grid.")
+        if loops < 1:
+            raise ValueError("loops must be at least 1.")
+        self.name = name
+        self.values = values
+        self.settle_time = settle_time
+        self.settle_per_unit = settle_per_unit
+        self.hysteresis = hysteresis
+        self.loops = loops
+
+    def step_cost(self):
+        """Settle time of one full-range jump, used to rank axes."""
+        span = float(self.values.max() - self.values.min())
+        return self.settle_time + self.settle_per_unit * span
+
+
+class SweepPlan:
+    """
+    A compiled sweep: one row of setpoints per point, in execution order.
+
+    setpoints[i, j] is the value of axes[j] at point i, changed[i, j] tells
+    whether that axis has to be written, and settle[i] is the time to wait
+    after writing. column(name) gives the per-point values of one axis,
+    e.g. for an instrument list sweep.
+    """
+
+    def __init__(self, axes, setpoints, loop, forward, settle_times, settle_per_unit):
+        self.axes = tuple(axes)
+        self.setpoints = setpoints
+        self.loop = loop
+        self.forward = forward
+        jumps = np.abs(np.diff(setpoints, axis=0, prepend=np.nan))
+        self.changed = ~(jumps == 0)
+        jumps = np.where(np.isnan(jumps), 0.0, jumps)
+        settle = np.where(self.changed, settle_times + settle_per_unit * jumps, 0.0)
+        self.settle = settle.max(axis=1)
+
+    def __len__(self):
+        return len(self.setpoints)
+
+    def column(self, name):
+        return self.setpoints[:, self.axes.index(name)]
+
+    def total_settle_time(self):
+        return float(self.settle.sum())
+
+
+class SweepPlanner:
+    """
+    Orders a multi-axis grid so that slow-settling sources move as little as possible.
+
+    With order="auto" the axis with the most expensive full-range jump
+    becomes the outermost loop; a hysteresis axis is always innermost. With
+    traversal="serpentine" every inner axis reverses direction each time an
+    outer axis steps, so consecutive points never jump across a whole range;
+    "raster" restarts every inner axis from its first value.
+    """
+
+    def __init__(self, axes, order="auto", traversal="serpentine"):
+        if order not in ("auto", "given"):
+            raise ValueError("order must be 'auto' or 'given'.")
+        if traversal not in ("serpentine", "raster"):
+            raise ValueError("traversal must be 'serpentine' or 'raster'.")
+        names = [axis.name for axis in axes]
+        if len(set(names)) != len(names):
+            raise ValueError("Each axis can only appear once.")
+        hysteresis = [axis for axis in axes if axis.hysteresis]
+        if len(hysteresis) > 1:
+            raise ValueError("Only one axis can be swept as a hysteresis loop.")
+        others = [axis for axis in axes if not axis.hysteresis]
+        if order == "auto":
+            others.sort(key=lambda axis: axis.step_cost(), reverse=True)
+        self.axes = others + hysteresis
+        self.traversal = traversal
+
+    def plan(self):
+        axes = self.axes
+        hysteresis = axes[-1] if axes[-1].hysteresis else None
+        grids = [axis.values for axis in axes]
+        if hysteresis is not None:
+            # Forward then backward, `loops` times, as one long innermost axis
+            loop_values = np.concatenate([hysteresis.values, hysteresis.values[::-1]])
+            grids[-1] = np.tile(loop_values, hysteresis.loops)
+        sizes = [len(grid) for grid in grids]
+
+        # Raster indices, outermost axis first
+        index = np.indices(sizes).reshape(len(sizes), -1).T
+        raster = index.copy()
+        if self.traversal == "serpentine":
+            # An inner axis runs backwards on every odd pass, counting passes
+            # by the raster position of the axes outside it
+            passes = np.zeros(len(index), dtype=np.int64)
+            for k in range(len(sizes)):
+                # A hysteresis loop already ends where it started
+                if k > 0 and not (hysteresis is not None and k == len(sizes) - 1):
+                    reverse = passes % 2 == 1
+                    index[reverse, k] = sizes[k] - 1 - index[reverse, k]
+                passes = passes * sizes[k] + raster[:, k]
+
+        setpoints = np.column_stack([grid[index[:, k]] for k, grid in enumerate(grids)])
+        if hysteresis is not None:
+            inner = index[:, -1]
+            n = len(hysteresis.values)
+            # Loops are numbered across the settings of the outer axes, so no two share a number
+            outer = np.ravel_multi_index(tuple(raster[:, :-1].T), sizes[:-1]) if len(sizes) > 1 else 0
+            loop = outer * hysteresis.loops + inner // (2 * n) + 1
+            forward = inner % (2 * n) < n
+        else:
+            loop = np.ones(len(index), dtype=np.int64)
+            forward = np.ones(len(index), dtype=bool)
+
+        return SweepPlan(
+            [axis.name for axis in axes], setpoints, loop, forward,
+            np.array([axis.settle_time for axis in axes]),
+            np.array([axis.settle_per_unit for axis in axes]),
+        )
+
+
+def hysteresis_grid(pbz_currents, bias_currents, loops):
+    """
+    Plan of `loops` complete PBZ hysteresis loops at every B2900 bias current.
+
+    The bias is the outer axis, so it only changes between loops: loop g,
+    counted from 1 over all biases, is at bias_currents[(g - 1) // loops].
+    Columns are ("b2900_current", "pbz_current"); grid_row() finds a point.
+    """
+    return SweepPlanner([Axis("b2900_current", bias_currents),
+                         Axis("pbz_current", pbz_currents, hysteresis=True, loops=loops)], order="given").plan()
+
+
+def grid_row(loop, forward, index, steps):
+    """Row of point `index` of the forward or backward half of loop `loop` in a hysteresis_grid plan"""
+    return ((loop - 1) * 2 + (0 if forward else 1)) * steps + index
@@ -0,0 +1,157 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import Future
+from sweep_engine import default_plot_fields
+
+
+class SweepRun:
+    """
+    A sweep_engine sweep running on a background thread.
+
+    start() returns it at once, so the caller (e.g. a Jupyter kernel) stays
+    free. progress, records() and pause/resume/stop work while the sweep
+    runs, and the run is awaitable: `await run` gives the final rows, as
+    result() does for blocking code.
+    """
+
+    def __init__(self, sweep):
+        self.sweep = sweep
+        self.future = Future()
+        self.started = time.time()
+        self.finished = None
+        self._thread = threading.Thread(target=self._run, name=type(sweep).__name__, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        self.future.set_running_or_notify_cancel()
+        try:
+            result = self.sweep.run()
+        except BaseException as e:
+            self.finished = time.time()
+            self.future.set_exception(e)
+        else:
+            self.finished = time.time()
+            self.future.set_result(result)
+
+    @property
+    def fields(self):
+        return self.sweep.FIELDS
+
+    @property
+    def progress(self):
+        """Fraction of the points measured so far"""
+        return self.sweep.count / self.sweep.total_points if self.sweep.total_points else 1.0
+
+    def eta(self):
+        """Estimated seconds left, from the average time per point so far"""
+        count = self.sweep.count
+        if self.done():
+            return 0.0
+        if count == 0:
+            return None
+        return (time.time() - self.started) / count * (self.sweep.total_points - count)
+
+    @property
+    def data(self):
+        """Live view of the rows measured so far; it does not grow, read it again for new rows"""
+        return self.sweep.records()
+
+    def records(self):
+        """Copy of the rows measured so far"""
+        return self.sweep.records().copy()
+
+    def column(self, name):
+        return self.sweep.records()[:, self.fields.index(name)]
+
+    def completed(self, field=None):
+        """
+        Rows of the loops (or repeats) that are finished.
+
+        While the sweep runs, the group of the last row may still grow and
+        is left out; analysis of these rows does not change any more.
+        Sweeps without loops or repeats (FrequencySweep) have no open
+        group, so all their rows are returned.
+        """
+        rows = self.sweep.records()
+        if field is None:
+            field = next((name for name in ("loop", "repeat") if name in self.fields), None)
+        if field is None or self.done() or len(rows) == 0:
+            return rows
+        group = rows[:, self.fields.index(field)]
+        return rows[group < group[-1]]
+
+    def on_point(self, callback):
+        """Registers callback(sweep, row), called on the sweep thread after every point"""
+        self.sweep.point_callbacks.append(callback)
+
+    def pause(self):
+        self.sweep.pause()
+
+    def resume(self):
+        self.sweep.resume()
+
+    def stop(self, wait=True):
+        """Ends the sweep after the current point, by default waiting for it"""
+        self.sweep.stop()
+        if wait:
+            self._thread.join()
+
+    @property
+    def paused(self):
+        return self.sweep.paused
+
+    def done(self):
+        return self.future.done()
+
+    def result(self, timeout=None):
+        """Blocks until the sweep ends and returns its rows, re-raising its error if it failed"""
+        return self.future.result(timeout)
+
+    def __await__(self):
+        return asyncio.wrap_future(self.future).__await__()
+
+    def __repr__(self):
+        if not self.done():
+            state = "paused" if self.paused else "running"
+        else:
+            state = "failed" if self.future.exception() else "finished"
+        eta = self.eta()
+        eta = f", {eta / 60:.1f} min left" if eta else ""
+        return (f"<{type(self.sweep).__name__}: {self.sweep.count}/{self.sweep.total_points} points "
+                f"({100 * self.progress:.0f} %), {state}{eta}>")
+
+    async def live_plot(self, x_field=None, y_field=None, interval=1.0):
+        """
+        Inline plot in Jupyter, redrawn every `interval` seconds until the run ends.
+
+        Run it with asyncio.ensure_future(run.live_plot()) to keep the
+        notebook usable meanwhile. The axes default to
+        sweep_engine.default_plot_fields. Needs matplotlib.
+        """
+        import matplotlib.pyplot as plt
+        from IPython.display import display
+
+        default_x, default_y = default_plot_fields(self.fields)
+        x_index = self.fields.index(x_field or default_x)
+        y_index = self.fields.index(y_field or default_y)
+        figure, axes = plt.subplots()
+        handle = display(figure, display_id=True)
+        plt.close(figure)
+        while True:
+            rows = self.sweep.records()
+            axes.clear()
+            axes.plot(rows[:, x_index], rows[:, y_index], ".-")
+            axes.set_xlabel(self.fields[x_index])
+            axes.set_ylabel(self.fields[y_index])
+            axes.set_title(repr(self))
+            axes.grid(True)
+            handle.update(figure)
+            if self.done():
+                return figure
+            await asyncio.sleep(interval)
+
+
+def start(sweep):
+    """Starts sweep.run() on a background thread and returns its SweepRun"""
+    return SweepRun(sweep)
@@ -0,0 +1,190 @@
+import json
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager, nullcontext
+
+# Upper edges (seconds) of the latency histogram buckets; the last bucket is open-ended.
+LATENCY_BUCKETS = (1e-4, 3e-4, 1e-3, 3e-3, 1e-2, 3e-2, 0.1, 0.3, 1.0, 3.0)
+
+_NULL_PHASE = nullcontext()
+
+
+def command_key(command):
+    """Returns the SCPI header of a command, e.g. 'CURR' for 'CURR 0.1'."""
+    if isinstance(command, bytes):
+        command = command.decode(errors="replace")
+    return command.strip().split(" ", 1)[0]
+
+
+class Tracer:
+    """
+    Records per-command latency of instrument I/O into a ring buffer.
+
+    Drivers check `tracer.enabled` before doing anything else, so a disabled
+    tracer costs one attribute lookup per command.
+    """
+
+    def __init__(self, capacity=100000):
+        self.enabled = False
+        self.events = deque(maxlen=capacity)
+        self.histograms = {}
+        self._phases = {}
+        self._lock = threading.Lock()
+        self._t0 = time.perf_counter()
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def clear(self):
+        with self._lock:
+            self.events.clear()
+            self.histograms.clear()
+            self._phases.clear()
+
+    def record(self, device, command, nbytes, start, end, error=None):
+        """Stores one completed command and updates its latency histogram."""
+        duration = end - start
+        key = (device, command_key(command))
+        with self._lock:
+            self.events.append((device, command, nbytes, start, duration, error))
+            counts = self.histograms.get(key)
+            if counts is None:
+                counts = self.histograms[key] = [0] * (len(LATENCY_BUCKETS) + 1)
+            for i, edge in enumerate(LATENCY_BUCKETS):
+                if duration <= edge:
+                    counts[i] += 1
+                    break
+            else:
+                counts[-1] += 1
+
+    def call(self, device, command, func, *args):
+        """Runs `func(*args)` and records it as `command` on `device`."""
+        start = time.perf_counter()
+        try:
+            result = func(*args)
+        except Exception as e:
+            self.record(device, command, len(command), start, time.perf_counter(), repr(e))
+            raise
+        end = time.perf_counter()
+        nbytes = len(command)
+        if isinstance(result, (str, bytes)):
+            nbytes += len(result)
+        self.record(device, command, nbytes, start, end)
+        return result
+
+    def phase(self, name):
+        """Context manager accumulating wall time of a sweep phase (settle, sample, ...)."""
+        if not self.enabled:
+            return _NULL_PHASE
+        return self._timed_phase(name)
+
+    @contextmanager
+    def _timed_phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            with self._lock:
+                self._phases[name] = self._phases.get(name, 0.0) + (end - start)
+                self.events.append(("phase", name, 0, start, end - start, None))
+
+    def take_phases(self):
+        """Returns the phase times accumulated since the last call and resets them."""
+        with self._lock:
+            phases, self._phases = self._phases, {}
+        return phases
+
+    def format_phases(self):
+        """Formats the per-point phase breakdown for the GUI stats labels."""
+        phases = self.take_phases()
+        if not phases:
+            return ""
+        return " | " + ", ".join(f"{name}: {t * 1e3:.1f} ms" for name, t in phases.items())
+
+    def latency_summary(self):
+        """Returns {(device, command): {'count', 'mean', 'max', 'histogram'}}."""
+        with self._lock:
+            events = list(self.events)
+            histograms = {k: list(v) for k, v in self.histograms.items()}
+        summary = {}
+        for device, command, _, _, duration, _ in events:
+            if device == "phase":
+                continue
+            s = summary.setdefault((device, command_key(command)), {"count": 0, "total": 0.0, "max": 0.0})
+            s["count"] += 1
+            s["total"] += duration
+            s["max"] = max(s["max"], duration)
+        for key, s in summary.items():
+            s["mean"] = s.pop("total") / s["count"]
+            s["histogram"] = histograms.get(key, [])
+        return summary
+
+    def export_chrome_trace(self, filename):
+        """Writes the buffered events in Chrome trace format (chrome://tracing, Perfetto)."""
+        with self._lock:
+            events = list(self.events)
+        trace = []
+        tids = {}
+        for device, command, nbytes, start, duration, error in events:
+            if device not in tids:
+                tids[device] = len(tids) + 1
+                trace.append({"name": "thread_name", "ph": "M", "pid": 1, "tid": tids[device],
+                              "args": {"name": device}})
+            if isinstance(command, bytes):
+                command = command.decode(errors="replace")
+            args = {"bytes": nbytes}
+            if error:
+                args["error"] = error
+            trace.append({
+                "name": command.strip(),
+                "cat": device,
+                "ph": "X",
+                "ts": (start - self._t0) * 1e6,
+                "dur": duration * 1e6,
+                "pid": 1,
+                "tid": tids[device],
+                "args": args,
+            })
+        with open(filename, "w") as f:
+            json.dump({"traceEvents": trace, "displayTimeUnit": "ms"}, f)
+
+
+class TracedResource:
+    """Wraps a VISA resource so that write/query calls are recorded by the tracer."""
+
+    def __init__(self, resource, device):
+        self._resource = resource
+        self._device = device
+
+    def write(self, command):
+        if not tracer.enabled:
+            return self._resource.write(command)
+        return tracer.call(self._device, command, self._resource.write, command)
+
+    def query(self, command):
+        if not tracer.enabled:
+            return self._resource.query(command)
+        return tracer.call(self._device, command, self._resource.query, command)
+
+    def write_raw(self, message):
+        if not tracer.enabled:
+            return self._resource.write_raw(message)
+        return tracer.call(self._device, message.decode(errors="replace"), self._resource.write_raw, message)
+
+    def __getattr__(self, name):
+        return getattr(self._resource, name)
+
+    def __setattr__(self, name, value):
+        if name.startswith("_"):
+            object.__setattr__(self, name, value)
+        else:
+            setattr(self._resource, name, value)
+
+
+# Process-wide tracer shared by all drivers.
+tracer = Tracer()
@@ -0,0 +1,167 @@
+import atexit
+import threading
+import time
+import pyvisa
+from pyvisa import constants
+
+# Status codes that mean the session itself is gone, as opposed to a slow instrument.
+_CONNECTION_ERRORS = {
+    constants.StatusCode.error_connection_lost,
+    constants.StatusCode.error_invalid_object,
+    constants.StatusCode.error_resource_not_found,
+    constants.StatusCode.error_no_listeners,
+    constants.StatusCode.error_io,
+    constants.StatusCode.error_closing_failed,
+}
+
+_lock = threading.RLock()
+_resource_manager = None
+_sessions = {}
+
+
+def get_resource_manager():
+    """Returns the process-wide ResourceManager, creating it on first use."""
+    global _resource_manager
+    with _lock:
+        if _resource_manager is None:
+            _resource_manager = pyvisa.ResourceManager()
+        return _resource_manager
+
+
+def _is_connection_error(error):
+    if isinstance(error, pyvisa.errors.InvalidSession):
+        return True
+    return isinstance(error, pyvisa.errors.VisaIOError) and error.error_code in _CONNECTION_ERRORS
+
+
+class PooledResource:
+    """
+    A shared VISA session that re-opens itself when the connection drops.
+
+    Dropped sessions are only detected when a call fails; the call is then
+    retried once on a fresh session, re-opened with exponential backoff.
+    """
+
+    def __init__(self, resource_name, options, retries=5, backoff=0.2):
+        self._resource_name = resource_name
+        self._options = dict(options)
+        self._retries = retries
+        self._backoff = backoff
+        self._resource = None
+        self._reused = False
+        self._open()
+
+    @property
+    def resource_name(self):
+        return self._resource_name
+
+    @property
+    def reused(self):
+        """True when the last controller got an already-open session."""
+        return self._reused
+
+    def _open(self):
+        resource = get_resource_manager().open_resource(self._resource_name)
+        for name, value in self._options.items():
+            setattr(resource, name, value)
+        self._resource = resource
+
+    def reopen(self):
+        """Closes the current session and opens a new one, backing off between attempts."""
+        try:
+            self._resource.close()
+        except Exception:
+            pass
+        last_error = None
+        for attempt in range(self._retries):
+            time.sleep(self._backoff * 2 ** attempt)
+            try:
+                self._open()
+                print(f"Reconnected to {self._resource_name}")
+                return
+            except Exception as e:
+                last_error = e
+        raise ConnectionError(f"Could not reconnect to {self._resource_name}: {last_error}")
+
+    def _call(self, name, *args):
+        try:
+            return getattr(self._resource, name)(*args)
+        except Exception as e:
+            if not _is_connection_error(e):
+                raise
+            print(f"Connection to {self._resource_name} lost ({e}), reconnecting...")
+            self.reopen()
+            return getattr(self._resource, name)(*args)
+
+    def write(self, command):
+        return self._call("write", command)
+
+    def query(self, command):
+        return self._call("query", command)
+
+    def read(self):
+        return self._call("read")
+
+    def write_raw(self, message):
+        return self._call("write_raw", message)
+
+    def read_raw(self):
+        return self._call("read_raw")
+
+    def close(self):
+        """Really closes the session; use the module-level close() to also drop it from the pool."""
+        self._resource.close()
+
+    def __getattr__(self, name):
+        return getattr(self._resource, name)
+
+    def __setattr__(self, name, value):
+        if name.startswith("_"):
+            object.__setattr__(self, name, value)
+        else:
+            self._options[name] = value
+            setattr(self._resource, name, value)
+
+
+def open_resource(resource_name, **options):
+    """
+    Returns the shared session for `resource_name`, opening it if needed.
+
+    Keyword options (timeout, read_termination, ...) are applied to the
+    session and re-applied whenever it is re-opened. Sessions stay open
+    until close() or close_all(), so the next run in the process reuses them.
+    """
+    with _lock:
+        session = _sessions.get(resource_name)
+        if session is None:
+            session = _sessions[resource_name] = PooledResource(resource_name, options)
+        else:
+            session._reused = True
+            for name, value in options.items():
+                setattr(session, name, value)
+        return session
+
+
+def close(resource_name):
+    """Closes and forgets the session for `resource_name`."""
+    with _lock:
+        session = _sessions.pop(resource_name, None)
+    if session is not None:
+        try:
+            session.close()
+        except Exception as e:
+            print(f"Error closing {resource_name}: {e}")
+
+
+def close_all():
+    """Closes every pooled session and the shared ResourceManager."""
+    global _resource_manager
+    for resource_name in list(_sessions):
+        close(resource_name)
+    with _lock:
+        if _resource_manager is not None:
+            _resource_manager.close()
+            _resource_manager = None
+
+
+atexit.register(close_all)